@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class User(BaseModel):
     name: str
@@ -13,3 +13,10 @@ class LoginUser(BaseModel):
 class OwnershipVerificationRequest(BaseModel):
     nft_id: str
     owner_mail: str
+
+class BulkOwnershipItem(BaseModel):
+    nft_id: str
+    owner_mail: Optional[str] = None  # Defaults to the owner on record
+
+class BulkOwnershipVerificationRequest(BaseModel):
+    items: List[BulkOwnershipItem]
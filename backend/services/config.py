@@ -0,0 +1,8 @@
+"""
+Helpers for reading service settings from the environment.
+"""
+import os
+
+
+def env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ('1', 'true', 'yes', 'on')
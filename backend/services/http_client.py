@@ -0,0 +1,116 @@
+"""
+App-wide pooled HTTP client used for fetching NFT images.
+
+A single ``httpx.AsyncClient`` is created in the app lifespan so connections to
+Cloudinary are kept alive and reused across requests instead of paying a new
+TCP and TLS handshake on every verification and purchase.
+"""
+import os
+import time
+
+import httpx
+
+from services.config import env_bool
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+class PooledHttpClient:
+    def __init__(self):
+        self._client = None
+        self.max_response_bytes = None
+        self._stats = {
+            "requests": 0,
+            "new_connections": 0,
+            "http2_requests": 0,
+            "bytes_received": 0,
+            "rejected_too_large": 0,
+            "errors": 0,
+        }
+        self._started_at = None
+
+    async def start(self):
+        if self._client is not None:
+            return
+        limits = httpx.Limits(
+            max_connections=int(os.getenv('HTTP_MAX_CONNECTIONS', 100)),
+            max_keepalive_connections=int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', 20)),
+            keepalive_expiry=float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 30)),
+        )
+        timeout = httpx.Timeout(
+            float(os.getenv('HTTP_READ_TIMEOUT', 30)),
+            connect=float(os.getenv('HTTP_CONNECT_TIMEOUT', 5)),
+            pool=float(os.getenv('HTTP_POOL_TIMEOUT', 10)),
+        )
+        self.max_response_bytes = int(os.getenv('HTTP_MAX_RESPONSE_BYTES', 64 * 1024 * 1024))
+        self._client = httpx.AsyncClient(
+            http2=env_bool('HTTP_ENABLE_HTTP2', 'true'),
+            limits=limits,
+            timeout=timeout,
+            follow_redirects=True,
+        )
+        self._started_at = time.monotonic()
+
+    async def stop(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("HTTP client is not running")
+        return self._client
+
+    async def _trace(self, event_name: str, info: dict):
+        # httpcore only opens a TCP connection when none can be reused from the pool
+        if event_name == 'connection.connect_tcp.complete':
+            self._stats['new_connections'] += 1
+        elif event_name == 'http2.send_request_headers.started':
+            self._stats['http2_requests'] += 1
+
+    def stream(self, method: str, url: str, **kwargs):
+        self._stats['requests'] += 1
+        extensions = dict(kwargs.pop('extensions', None) or {})
+        extensions['trace'] = self._trace
+        return self.client.stream(method, url, extensions=extensions, **kwargs)
+
+    async def get_bytes(self, url: str, **kwargs) -> bytes:
+        """GET ``url`` and return the body, refusing bodies over the configured size."""
+        try:
+            async with self.stream('GET', url, **kwargs) as img_response:
+                if img_response.status_code != 200:
+                    raise Exception("Image could not be retrieved")
+
+                declared = img_response.headers.get('content-length')
+                if declared and declared.isdigit() and int(declared) > self.max_response_bytes:
+                    self._stats['rejected_too_large'] += 1
+                    raise ResponseTooLarge(f"Response exceeds {self.max_response_bytes} bytes")
+
+                body = bytearray()
+                async for data in img_response.aiter_bytes():
+                    body += data
+                    if len(body) > self.max_response_bytes:
+                        self._stats['rejected_too_large'] += 1
+                        raise ResponseTooLarge(f"Response exceeds {self.max_response_bytes} bytes")
+
+                self._stats['bytes_received'] += len(body)
+                return bytes(body)
+        except Exception:
+            self._stats['errors'] += 1
+            raise
+
+    def metrics(self) -> dict:
+        requests = self._stats['requests']
+        reused = max(requests - self._stats['new_connections'], 0)
+        return {
+            **self._stats,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / requests, 4) if requests else 0.0,
+            "uptime_seconds": round(time.monotonic() - self._started_at, 1) if self._started_at else 0.0,
+        }
+
+
+http_client = PooledHttpClient()
@@ -0,0 +1,137 @@
+"""
+Size-bounded on-disk LRU cache of NFT master images.
+
+Entries are keyed by ``nft_id`` plus the image version (the Cloudinary ``v<timestamp>``
+segment of the URL), so an overwritten image never serves stale bytes. Reads are
+memory-mapped, which keeps repeat verifications off the network and out of the
+Python heap.
+"""
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+CLOUDINARY_VERSION_RE = re.compile(r'/v(\d+)/')
+
+
+def image_version(image_url: str) -> str:
+    match = CLOUDINARY_VERSION_RE.search(image_url or '')
+    if match:
+        return f"v{match.group(1)}"
+    # Not a versioned Cloudinary URL, fall back to a digest of the URL itself
+    return hashlib.sha1((image_url or '').encode('utf-8')).hexdigest()[:16]
+
+
+class ImageCache:
+    def __init__(self):
+        self.directory = None
+        self.max_bytes = None
+        self._entries = OrderedDict()  # (nft_id, version) -> size, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "invalidations": 0}
+
+    def start(self):
+        self.directory = os.getenv('IMAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'stegavault_image_cache'))
+        self.max_bytes = int(os.getenv('IMAGE_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Rebuild the index from files left by a previous run, oldest access first
+        files = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith('.img'):
+                continue
+            nft_id, _, version = file_name[:-len('.img')].partition('_')
+            stat = os.stat(os.path.join(self.directory, file_name))
+            files.append((stat.st_atime, (nft_id, version), stat.st_size))
+
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            for _, key, size in sorted(files):
+                self._entries[key] = size
+                self._total_bytes += size
+            self._evict()
+
+    def _path(self, nft_id: str, version: str) -> str:
+        return os.path.join(self.directory, f"{nft_id}_{version}.img")
+
+    def _remove(self, key):
+        size = self._entries.pop(key)
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(*key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self._stats['evictions'] += 1
+
+    def open(self, nft_id: str, version: str) -> Optional[mmap.mmap]:
+        """Return a read-only memory map of the cached image, or None. Callers close it."""
+        key = (nft_id, version)
+        with self._lock:
+            if key not in self._entries:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+
+        try:
+            with open(self._path(nft_id, version), 'rb') as cached_file:
+                return mmap.mmap(cached_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # Removed behind our back or empty, drop the stale index entry
+            with self._lock:
+                if key in self._entries:
+                    self._remove(key)
+            return None
+
+    def put(self, nft_id: str, version: str, data) -> None:
+        """Store an image version, replacing any other cached version of the NFT."""
+        if self.directory is None or len(data) > self.max_bytes:
+            return
+
+        # Write to a temporary file first so readers never map a half written image
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, self._path(nft_id, version))
+
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == nft_id and key[1] != version]:
+                self._remove(key)
+            if (nft_id, version) in self._entries:
+                self._total_bytes -= self._entries[(nft_id, version)]
+            self._entries[(nft_id, version)] = len(data)
+            self._entries.move_to_end((nft_id, version))
+            self._total_bytes += len(data)
+            self._stats['writes'] += 1
+            self._evict()
+
+    def invalidate(self, nft_id: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == nft_id]:
+                self._remove(key)
+                self._stats['invalidations'] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+image_cache = ImageCache()
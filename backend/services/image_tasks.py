@@ -0,0 +1,207 @@
+"""
+Image and steganography tasks executed inside the image process pool workers.
+
+Every function here must stay importable at module level so it can be pickled by
+reference and run in a spawned worker process.
+"""
+import functools
+import io
+import os
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+from services import steganography
+from services.process_pool import SharedImage
+
+
+class ImageRejected(ValueError):
+    # The upload itself can't be minted, as opposed to a failure on our side
+    pass
+
+
+class ImageLimitExceeded(ImageRejected):
+    pass
+
+
+class ImageTooSmall(ImageRejected):
+    pass
+
+
+# Output encodings for watermarked images, selected with IMAGE_ENCODING_PROFILE.
+# All of them are lossless so the embedded least significant bits survive.
+ENCODING_PROFILES = {
+    # Least CPU, largest files
+    'fast': ('PNG', {'compress_level': 1}),
+    # Pillow's default zlib level
+    'balanced': ('PNG', {'compress_level': 6}),
+    # Smallest PNG, slowest to encode
+    'archival': ('PNG', {'compress_level': 9, 'optimize': True}),
+    # Usually much smaller than PNG, exact keeps RGB values under transparent pixels
+    'webp': ('WEBP', {'lossless': True, 'quality': 80, 'method': 4, 'exact': True}),
+}
+
+# WebP can't represent larger canvases
+WEBP_MAX_DIMENSION = 16383
+
+# Downscaled listing images: name -> (longest side, WebP quality). They carry no
+# payload, so unlike the master they can be compressed lossily.
+RENDITIONS = {
+    'preview': (1280, 80),
+    'thumbnail': (400, 75),
+}
+
+
+@contextmanager
+def open_shared_image(handle: SharedImage):
+    shm = shared_memory.SharedMemory(name=handle.name)
+    try:
+        view = shm.buf[:handle.size]
+        try:
+            img = Image.open(io.BytesIO(view))
+            img.load()
+        finally:
+            # The view must be released before the shared memory block can be closed
+            view.release()
+        yield img
+    finally:
+        shm.close()
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+def ingest_upload(path: str, payload: str, max_pixels: int):
+    """
+    Decode a spooled upload once, look for an existing payload and embed ``payload``.
+
+    Returns the previously hidden data (or None), the encoded watermarked image, the
+    perceptual hash of the original artwork and its listing renditions. Decode errors
+    are raised to the caller while a failed reveal simply means there is no hidden data.
+    """
+    img = Image.open(path)
+    try:
+        # Only the header has been read so far, refuse oversized canvases before decoding them
+        if img.width * img.height > max_pixels:
+            raise ImageLimitExceeded(
+                f"Image is {img.width}x{img.height}, at most {max_pixels} pixels are allowed"
+            )
+        # Loading also closes the file once the pixels are decoded
+        img.load()
+    except Exception:
+        img.close()
+        raise
+    if img.width * img.height < steganography.required_pixels(payload):
+        img.close()
+        raise ImageTooSmall(f"Image is {img.width}x{img.height}, too small to hold the ownership data")
+    rgb = _to_rgb(img)
+    # Hashed before embedding, although the payload only touches the lowest bits anyway
+    phash = dhash(rgb)
+    renditions = _renditions(rgb)
+
+    if steganography.get_engine() == steganography.ENGINE_STEGANO:
+        try:
+            # stegano closes the image it is given, keep ours for the embed
+            hidden_data = steganography.reveal(rgb.copy())
+        except Exception as steg_error:
+            print(f"Steganography extraction error (likely no hidden data): {str(steg_error)}")
+            hidden_data = None
+        stego_img = steganography.hide(rgb, payload)
+    else:
+        # One RGB pixel buffer serves both the check and the embed
+        pixels = np.array(rgb, dtype=np.uint8)
+        rgb.close()
+        try:
+            hidden_data = steganography.reveal_array(pixels)
+        except Exception as steg_error:
+            print(f"Steganography extraction error (likely no hidden data): {str(steg_error)}")
+            hidden_data = None
+        stego_img = Image.fromarray(steganography.hide_array(pixels, payload))
+
+    return hidden_data, encode_image(stego_img), phash, renditions
+
+
+def dhash(img: Image.Image, hash_size: int = 8) -> str:
+    """
+    Difference hash of an image as a hex string.
+
+    The image is shrunk to (hash_size + 1) x hash_size grayscale pixels and each bit
+    records whether a pixel is brighter than its right neighbour, so the hash follows
+    the gradients of the artwork rather than its exact pixel values.
+    """
+    small = img.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS, reducing_gap=2.0)
+    pixels = np.asarray(small, dtype=np.int16)
+    return np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes().hex()
+
+
+def get_encoding_profile() -> str:
+    profile = os.getenv('IMAGE_ENCODING_PROFILE', 'balanced').strip().lower()
+    if profile not in ENCODING_PROFILES:
+        raise ValueError(f"Unknown image encoding profile: {profile}")
+    return profile
+
+
+@functools.cache
+def _configured_profile() -> str:
+    # Read once per worker process, check_settings has validated it at startup
+    return get_encoding_profile()
+
+
+def check_settings():
+    """Validate the image settings at startup, so a typo fails there instead of on every mint."""
+    get_encoding_profile()
+    steganography.get_engine()
+
+
+def encode_image(img: Image.Image, profile: str = None) -> bytes:
+    """Encode a watermarked image with the given or configured lossless profile."""
+    profile = profile or _configured_profile()
+    image_format, options = ENCODING_PROFILES[profile]
+    if image_format == 'WEBP' and max(img.size) > WEBP_MAX_DIMENSION:
+        profile = 'balanced'
+        image_format, options = ENCODING_PROFILES[profile]
+
+    started = time.perf_counter()
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format, **options)
+    print(f"Encoded {img.width}x{img.height} image with the {profile} profile "
+          f"in {time.perf_counter() - started:.3f}s, {buffer.tell()} bytes")
+    return buffer.getvalue()
+
+
+def _renditions(img: Image.Image) -> dict:
+    renditions = {}
+    # Largest first, each smaller rendition is scaled down from the previous one
+    for name, (size, quality) in sorted(RENDITIONS.items(), key=lambda item: -item[1][0]):
+        img = img.copy()
+        img.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, format='WEBP', quality=quality, method=4)
+        renditions[name] = buffer.getvalue()
+    return renditions
+
+
+def render_renditions(handle: SharedImage) -> dict:
+    # Listing renditions for NFTs minted before they existed
+    with open_shared_image(handle) as img:
+        return _renditions(_to_rgb(img))
+
+
+def reveal_payload(handle: SharedImage):
+    with open_shared_image(handle) as img:
+        print(f"Image format: {img.format}, size: {img.size}, mode: {img.mode}")
+        return steganography.reveal(_to_rgb(img))
+
+
+def embed_payload(handle: SharedImage, payload: str) -> bytes:
+    # Embed the payload and return the encoded watermarked image
+    with open_shared_image(handle) as img:
+        stego_img = steganography.hide(_to_rgb(img), payload)
+
+    return encode_image(stego_img)
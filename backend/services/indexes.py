@@ -0,0 +1,191 @@
+"""
+Declarative MongoDB index registry.
+
+Indexes backing the hot query paths are declared once next to the collections
+and reconciled at startup: missing indexes are created and indexes whose keys or
+options changed are rebuilt. While an index is rebuilt a temporary guard index
+keeps its fields indexed, and if the new definition can't be built (e.g. duplicates
+blocking a unique index) the previous index is restored. Query shapes can be registered alongside
+them so ``check_query_plans`` can confirm through ``explain`` that none of them
+falls back to a collection scan.
+"""
+import asyncio
+import time
+from typing import NamedTuple
+
+from pymongo.errors import OperationFailure
+
+from services.config import env_bool
+
+
+# Index options that change an index's behaviour and so must match the declaration
+COMPARED_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+# Extra trailing key that makes a guard index's key pattern differ from the index it guards
+GUARD_KEY = '_index_rebuild'
+
+
+class IndexSpec(NamedTuple):
+    collection: object
+    keys: list
+    name: str
+    options: dict
+
+
+class QueryShape(NamedTuple):
+    collection: object
+    filter: dict
+    sort: list
+    description: str
+
+
+class IndexPlanError(Exception):
+    pass
+
+
+def index_name(keys: list) -> str:
+    # Same naming scheme MongoDB uses when no name is given
+    return '_'.join(f"{field}_{direction}" for field, direction in keys)
+
+
+def _option(options: dict, option: str):
+    # unique: False and a missing unique flag mean the same thing
+    value = options.get(option)
+    return bool(value) if option in ('unique', 'sparse') else value
+
+
+def _winning_stages(plan: dict):
+    # Walks every stage of a query plan, including $or branches
+    if not isinstance(plan, dict):
+        return
+    if 'stage' in plan:
+        yield plan['stage']
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            yield from _winning_stages(plan[key])
+    for child in plan.get('inputStages', []):
+        yield from _winning_stages(child)
+
+
+class IndexRegistry:
+    def __init__(self):
+        self._indexes = []
+        self._queries = []
+        self._task = None
+        self._stats = {"created": 0, "rebuilt": 0, "unchanged": 0, "failed": 0, "duration": None, "collscans": None}
+
+    def index(self, collection, keys, **options):
+        """Declare an index, ``keys`` is a field name or a list of (field, direction) pairs."""
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        name = options.pop('name', None) or index_name(keys)
+        self._indexes.append(IndexSpec(collection, list(keys), name, options))
+
+    def query(self, collection, filter: dict, sort: list = None, description: str = ''):
+        """Declare a hot query shape that must be served by an index."""
+        self._queries.append(QueryShape(collection, filter, sort, description or f"{collection.name} {filter}"))
+
+    def start(self):
+        # Index builds can take a while on large collections, don't hold up startup for them
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        try:
+            await self.reconcile()
+            if env_bool('INDEX_SELF_CHECK', 'false'):
+                failures = await self.check_query_plans()
+                for failure in failures:
+                    print(f"Index self-check: {failure}")
+        except Exception as e:
+            print(f"Error reconciling indexes: {str(e)}")
+
+    async def reconcile(self):
+        started = time.perf_counter()
+        existing = {}
+        for spec in self._indexes:
+            if spec.collection.name not in existing:
+                existing[spec.collection.name] = [index async for index in spec.collection.list_indexes()]
+
+            try:
+                await self._reconcile_index(spec, existing[spec.collection.name])
+            except OperationFailure as e:
+                # e.g. duplicates blocking a unique index, keep going with the others
+                self._stats['failed'] += 1
+                print(f"Failed to create index {spec.name} on {spec.collection.name}: {str(e)}")
+
+        self._stats['duration'] = round(time.perf_counter() - started, 3)
+        print(f"Indexes reconciled in {self._stats['duration']}s: {self._stats['created']} created, "
+              f"{self._stats['rebuilt']} rebuilt, {self._stats['unchanged']} unchanged, {self._stats['failed']} failed")
+
+    async def _reconcile_index(self, spec: IndexSpec, existing: list):
+        for index in existing:
+            same_keys = list(index['key'].items()) == spec.keys
+            if index['name'] != spec.name and not same_keys:
+                continue
+
+            if same_keys and all(_option(index, option) == _option(spec.options, option) for option in COMPARED_OPTIONS):
+                self._stats['unchanged'] += 1
+                return
+
+            # Same name or same keys but a different definition, rebuild it
+            print(f"Rebuilding index {index['name']} on {spec.collection.name}")
+            await self._rebuild_index(spec, index)
+            self._stats['rebuilt'] += 1
+            return
+
+        await spec.collection.create_index(spec.keys, name=spec.name, **spec.options)
+        self._stats['created'] += 1
+
+    async def _rebuild_index(self, spec: IndexSpec, index: dict):
+        # MongoDB refuses two indexes on the same keys with different options, so the
+        # replacement can't be built next to the old one. A plain guard index on the old
+        # keys serves the same queries while the old index is swapped for the new one.
+        old_keys = list(index['key'].items())
+        old_options = {option: index[option] for option in COMPARED_OPTIONS if option in index}
+        guard_name = f"{index['name']}_guard"
+        await spec.collection.create_index(old_keys + [(GUARD_KEY, 1)], name=guard_name)
+
+        await spec.collection.drop_index(index['name'])
+        try:
+            await spec.collection.create_index(spec.keys, name=spec.name, **spec.options)
+        except OperationFailure:
+            try:
+                await spec.collection.create_index(old_keys, name=index['name'], **old_options)
+            except OperationFailure as restore_error:
+                # Keep the guard so the fields stay indexed until this is sorted out
+                print(f"Failed to restore index {index['name']} on {spec.collection.name}, "
+                      f"keeping {guard_name}: {str(restore_error)}")
+                raise
+            await spec.collection.drop_index(guard_name)
+            print(f"Kept the previous definition of index {index['name']} on {spec.collection.name}")
+            raise
+        await spec.collection.drop_index(guard_name)
+
+    async def check_query_plans(self) -> list:
+        """Explain every registered query shape and return the ones that use a collection scan."""
+        failures = []
+        for shape in self._queries:
+            cursor = shape.collection.find(shape.filter)
+            if shape.sort:
+                cursor = cursor.sort(shape.sort)
+            plan = await cursor.explain()
+            stages = list(_winning_stages(plan.get('queryPlanner', {}).get('winningPlan', {})))
+            if 'COLLSCAN' in stages:
+                failures.append(f"{shape.description} uses a collection scan ({' <- '.join(stages)})")
+        self._stats['collscans'] = len(failures)
+        return failures
+
+    async def assert_query_plans(self):
+        """Raise IndexPlanError when any registered query shape falls back to COLLSCAN."""
+        failures = await self.check_query_plans()
+        if failures:
+            raise IndexPlanError('\n'.join(failures))
+
+    def metrics(self) -> dict:
+        return {**self._stats, "indexes": len(self._indexes), "query_shapes": len(self._queries)}
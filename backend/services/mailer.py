@@ -0,0 +1,154 @@
+"""
+Outbound email queue with a background sender.
+
+Request handlers only enqueue messages. A single sender task keeps one
+authenticated SMTP connection open, delivers queued messages in batches over it
+and retries failed messages with backoff, so a slow mail server never delays a
+request or blocks the event loop.
+"""
+import asyncio
+import os
+import smtplib
+import time
+from email.message import EmailMessage
+
+from services.config import env_bool
+
+
+class Mailer:
+    def __init__(self):
+        self.host = None
+        self.port = None
+        self.use_starttls = None
+        self.username = None
+        self.password = None
+        self.batch_size = None
+        self.max_retries = None
+        self.retry_backoff = None
+        self.idle_timeout = None
+        self._queue = None
+        self._task = None
+        self._connection = None
+        self._retry_tasks = set()
+        self._stats = {"queued": 0, "sent": 0, "failed": 0, "retries": 0, "connections": 0, "batches": 0}
+
+    def start(self):
+        self.host = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+        self.port = int(os.getenv('SMTP_PORT', 587))
+        self.use_starttls = env_bool('SMTP_STARTTLS', 'true')
+        self.username = os.getenv('EMAIL')
+        self.password = os.getenv('EMAIL_PASSWORD')
+        self.batch_size = int(os.getenv('MAIL_BATCH_SIZE', 20))
+        self.max_retries = int(os.getenv('MAIL_MAX_RETRIES', 5))
+        self.retry_backoff = float(os.getenv('MAIL_RETRY_BACKOFF', 2))
+        # Close the SMTP connection after this long without any mail to send
+        self.idle_timeout = float(os.getenv('MAIL_IDLE_TIMEOUT', 60))
+        self._queue = asyncio.Queue(maxsize=int(os.getenv('MAIL_QUEUE_SIZE', 1000)))
+        self._task = asyncio.create_task(self._sender())
+
+    async def stop(self):
+        for task in [self._task, *self._retry_tasks]:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*[task for task in [self._task, *self._retry_tasks] if task], return_exceptions=True)
+        self._task = None
+        self._retry_tasks.clear()
+        await asyncio.to_thread(self._disconnect)
+
+    def send(self, message: EmailMessage):
+        """Queue a message for delivery, raises asyncio.QueueFull when the queue is full."""
+        if self._queue is None:
+            raise RuntimeError("Mailer is not running")
+        self._queue.put_nowait((message, 0))
+        self._stats['queued'] += 1
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.use_starttls:
+            connection.starttls()
+        if self.username and self.password:
+            connection.login(self.username, self.password)
+        self._connection = connection
+        self._stats['connections'] += 1
+
+    def _disconnect(self):
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+            self._connection = None
+
+    def _deliver_batch(self, batch: list) -> list:
+        # Runs on a worker thread, returns the items that could not be delivered
+        failed = []
+        for message, attempts in batch:
+            for retry_connection in (False, True):
+                try:
+                    if self._connection is None:
+                        self._connect()
+                    self._connection.send_message(message)
+                    self._stats['sent'] += 1
+                    break
+                except OSError as e:
+                    # SMTP errors are OSErrors too, only a dropped or refused connection
+                    # means the kept-alive connection went stale and is worth one reconnect
+                    stale = isinstance(e, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)) \
+                        or not isinstance(e, smtplib.SMTPException)
+                    if stale:
+                        self._connection = None
+                    if retry_connection or not stale:
+                        print(f"Failed to send email to {message['To']}: {str(e)}")
+                        failed.append((message, attempts + 1))
+                        break
+        return failed
+
+    async def _retry_later(self, item, delay: float):
+        await asyncio.sleep(delay)
+        await self._queue.put(item)
+
+    async def _sender(self):
+        while True:
+            try:
+                try:
+                    first = await asyncio.wait_for(self._queue.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(self._disconnect)
+                    continue
+
+                batch = [first]
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+
+                started = time.perf_counter()
+                failed = await asyncio.to_thread(self._deliver_batch, batch)
+                self._stats['batches'] += 1
+                print(f"Mail batch of {len(batch)} delivered in {time.perf_counter() - started:.3f}s, {len(failed)} failed")
+
+                for message, attempts in failed:
+                    if attempts > self.max_retries:
+                        self._stats['failed'] += 1
+                        print(f"Giving up on email to {message['To']} after {attempts} attempts")
+                        continue
+                    self._stats['retries'] += 1
+                    task = asyncio.create_task(self._retry_later((message, attempts), self.retry_backoff * 2 ** (attempts - 1)))
+                    self._retry_tasks.add(task)
+                    task.add_done_callback(self._retry_tasks.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Mail sender error: {str(e)}")
+                await asyncio.sleep(1)
+
+    def metrics(self) -> dict:
+        return {
+            **self._stats,
+            "pending": self._queue.qsize() if self._queue else 0,
+            "scheduled_retries": len(self._retry_tasks),
+            "connected": self._connection is not None,
+        }
+
+
+mailer = Mailer()
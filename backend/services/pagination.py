@@ -0,0 +1,68 @@
+"""
+Keyset (cursor) pagination helpers for listings sorted newest first.
+
+A cursor is an opaque token holding the ``(timestamp, _id)`` of the last document
+of a page. The next page is everything strictly before it in
+``(timestamp desc, _id desc)`` order, which costs the same for every page and
+stays stable when documents are inserted while a client is paging.
+"""
+import base64
+import json
+from datetime import datetime, timezone, timedelta
+
+from bson import ObjectId, errors
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Sort order every keyset query must use so the cursor comparison matches it
+KEYSET_SORT = [("timestamp", -1), ("_id", -1)]
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Motor returns naive datetimes that are already in UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def encode_cursor(timestamp: datetime, object_id) -> str:
+    # MongoDB stores dates with millisecond precision, so milliseconds round-trip exactly
+    millis = (_as_utc(timestamp) - EPOCH) // timedelta(milliseconds=1)
+    raw = json.dumps({"t": millis, "id": str(object_id)}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return EPOCH + timedelta(milliseconds=int(data['t'])), ObjectId(data['id'])
+    except (ValueError, KeyError, TypeError, errors.InvalidId):
+        raise InvalidCursor("Invalid pagination cursor")
+
+
+def keyset_filter(base_filter: dict, cursor: str = None) -> dict:
+    """Restrict ``base_filter`` to documents that come after ``cursor``."""
+    if not cursor:
+        return base_filter
+    timestamp, object_id = decode_cursor(cursor)
+    return {
+        "$and": [
+            base_filter,
+            {"$or": [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$lt": object_id}},
+            ]},
+        ]
+    }
+
+
+def next_cursor(page: list, limit: int):
+    """Trim a page fetched with ``limit + 1`` documents and return it with the next cursor."""
+    has_more = len(page) > limit
+    page = page[:limit]
+    cursor = encode_cursor(page[-1]["timestamp"], page[-1]["_id"]) if has_more else None
+    return page, cursor
@@ -0,0 +1,97 @@
+"""
+bcrypt hashing and verification on a dedicated thread pool.
+
+bcrypt releases the GIL while it works, so running it on threads keeps logins from
+blocking the event loop. Concurrency is capped by the pool size and callers beyond a
+bounded wait queue are rejected straight away with ``PasswordHasherBusy``.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self):
+        self.workers = None
+        self.max_queue = None
+        self._executor = None
+        self._semaphore = None
+        self._waiting = 0
+        self._stats = {
+            "hashes": 0,
+            "checks": 0,
+            "rejected": 0,
+            "total_wait_seconds": 0.0,
+            "total_run_seconds": 0.0,
+            "max_latency_seconds": 0.0,
+        }
+
+    def start(self):
+        self.workers = int(os.getenv('PASSWORD_HASH_WORKERS', max((os.cpu_count() or 2) // 2, 1)))
+        self.max_queue = int(os.getenv('PASSWORD_HASH_MAX_QUEUE', 64))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+        self._semaphore = asyncio.Semaphore(self.workers)
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            raise RuntimeError("Password hasher is not running")
+
+        # Reject instead of queueing without bound, a login burst must not starve other endpoints
+        if self._waiting >= self.max_queue:
+            self._stats['rejected'] += 1
+            raise PasswordHasherBusy("Too many concurrent password operations")
+
+        queued = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        try:
+            started = time.perf_counter()
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+            finished = time.perf_counter()
+        finally:
+            self._semaphore.release()
+
+        self._stats['total_wait_seconds'] += started - queued
+        self._stats['total_run_seconds'] += finished - started
+        self._stats['max_latency_seconds'] = max(self._stats['max_latency_seconds'], finished - queued)
+        return result
+
+    async def hash(self, password: bytes, rounds: int) -> bytes:
+        hashed = await self._run(lambda: bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds)))
+        self._stats['hashes'] += 1
+        return hashed
+
+    async def check(self, password: bytes, hashed: bytes) -> bool:
+        matches = await self._run(bcrypt.checkpw, password, hashed)
+        self._stats['checks'] += 1
+        return matches
+
+    def metrics(self) -> dict:
+        operations = self._stats['hashes'] + self._stats['checks']
+        return {
+            **self._stats,
+            "average_wait_seconds": round(self._stats['total_wait_seconds'] / operations, 4) if operations else 0.0,
+            "average_run_seconds": round(self._stats['total_run_seconds'] / operations, 4) if operations else 0.0,
+            "waiting": self._waiting,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+        }
+
+
+password_hasher = PasswordHasher()
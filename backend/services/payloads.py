@@ -0,0 +1,146 @@
+"""
+Ownership payloads embedded in NFT images.
+
+The compact format (version 1) is a short binary record:
+
+    magic "SV" | version | len nft_id | len transaction_id | len owner_ref | len mac
+
+``nft_id`` and ``transaction_id`` are the raw 12 byte ObjectIds, ``owner_ref`` is
+a keyed hash of the owner's mail (the mail itself is not stored in the image) and
+``mac`` is a truncated HMAC-SHA256 over everything before it. Each field is
+prefixed with its length in one byte. The 49 byte record is embedded as 62
+Base85 characters, against 250-350 for the legacy HS256 JWT which is still
+accepted when decoding. It is armoured as ASCII because stegano writes anything
+beyond ASCII as UTF-8, so raw bytes would not round trip between the two engines.
+
+The format written for new images is selected with ``STEGO_PAYLOAD_FORMAT``
+(``compact`` or ``jwt``), defaulting to ``compact``.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+
+import jwt
+from bson import ObjectId
+
+
+FORMAT_COMPACT = 'compact'
+FORMAT_JWT = 'jwt'
+FORMATS = (FORMAT_COMPACT, FORMAT_JWT)
+
+MAGIC = b'SV'
+VERSION = 1
+OWNER_REF_BYTES = 8
+MAC_BYTES = 10
+
+
+class InvalidPayload(jwt.InvalidTokenError):
+    # Subclasses the JWT error so existing handlers treat both formats alike
+    pass
+
+
+def get_format():
+    payload_format = os.getenv('STEGO_PAYLOAD_FORMAT', FORMAT_COMPACT).strip().lower()
+    if payload_format not in FORMATS:
+        raise ValueError(f"Unknown payload format: {payload_format}")
+    return payload_format
+
+
+def _digest(key: str, purpose: bytes, data: bytes) -> bytes:
+    # Separate purposes so an owner reference can never pass as a MAC
+    return hmac.new(key.encode('utf-8'), purpose + b':' + data, hashlib.sha256).digest()
+
+
+def owner_reference(owner_mail: str, key: str) -> str:
+    return _digest(key, b'owner', owner_mail.strip().lower().encode('utf-8'))[:OWNER_REF_BYTES].hex()
+
+
+def encode_payload(nft_id: str, transaction_id: str, owner_mail: str, key: str) -> str:
+    """Build the string to embed for an NFT, in the configured format."""
+    if get_format() == FORMAT_JWT:
+        return jwt.encode(
+            {"data": {"owner_mail": owner_mail, "nft_id": nft_id, "transaction_id": transaction_id}},
+            key,
+            algorithm="HS256"
+        )
+
+    body = bytearray(MAGIC)
+    body.append(VERSION)
+    for field in (ObjectId(nft_id).binary, ObjectId(transaction_id).binary, bytes.fromhex(owner_reference(owner_mail, key))):
+        body.append(len(field))
+        body += field
+    mac = _digest(key, b'payload', bytes(body))[:MAC_BYTES]
+    body.append(len(mac))
+    body += mac
+    return base64.b85encode(bytes(body)).decode('ascii')
+
+
+def _compact_record(hidden_data: str):
+    # The raw record if hidden_data is a compact payload, None otherwise. JWTs contain
+    # dots which aren't part of the Base85 alphabet, so they never decode.
+    try:
+        raw = base64.b85decode(hidden_data.encode('ascii'))
+    except (ValueError, UnicodeEncodeError, binascii.Error):
+        return None
+    return raw if raw.startswith(MAGIC) else None
+
+
+def is_compact(hidden_data: str) -> bool:
+    return _compact_record(hidden_data) is not None
+
+
+def decode_payload(hidden_data: str, key: str) -> dict:
+    """
+    Decode an embedded payload of either format into ``{"data": {...}}``.
+
+    Legacy JWT payloads carry ``owner_mail``, compact ones carry ``owner_ref``.
+    Raises a ``jwt.InvalidTokenError`` (``InvalidPayload`` for the compact format)
+    when the payload is malformed or its signature doesn't match.
+    """
+    raw = _compact_record(hidden_data)
+    if raw is None:
+        return jwt.decode(hidden_data, key, algorithms=["HS256"])
+
+    if len(raw) < 3 or raw[2] != VERSION:
+        raise InvalidPayload(f"Unsupported payload version: {raw[2] if len(raw) > 2 else None}")
+
+    fields = []
+    offset = 3
+    while offset < len(raw):
+        length = raw[offset]
+        field = raw[offset + 1:offset + 1 + length]
+        if len(field) != length:
+            raise InvalidPayload("Truncated payload")
+        fields.append((offset, field))
+        offset += 1 + length
+    if len(fields) != 4:
+        raise InvalidPayload("Malformed payload")
+
+    (_, nft_id), (_, transaction_id), (_, owner_ref), (mac_offset, mac) = fields
+    expected = _digest(key, b'payload', raw[:mac_offset])[:MAC_BYTES]
+    if len(mac) != MAC_BYTES or not hmac.compare_digest(mac, expected):
+        raise InvalidPayload("Payload signature verification failed")
+    if len(nft_id) != 12 or len(transaction_id) != 12:
+        raise InvalidPayload("Malformed payload")
+
+    return {
+        "version": VERSION,
+        "data": {
+            "nft_id": str(ObjectId(nft_id)),
+            "transaction_id": str(ObjectId(transaction_id)),
+            "owner_ref": owner_ref.hex()
+        }
+    }
+
+
+def owner_matches(data: dict, owner_mail: str, key: str) -> bool:
+    """Check a decoded payload's ``data`` against an owner mail, whichever format it came from."""
+    if not owner_mail:
+        return False
+    if 'owner_mail' in data:
+        return data['owner_mail'] == owner_mail
+    if 'owner_ref' in data:
+        return hmac.compare_digest(data['owner_ref'], owner_reference(owner_mail, key))
+    return False
@@ -0,0 +1,190 @@
+"""
+In-memory perceptual hash index for near-duplicate artwork detection.
+
+Every minted NFT stores a 64 bit difference hash (dHash) of its artwork, computed
+before the ownership payload is embedded. Unlike the payload it survives resizing,
+re-encoding and small edits, so re-uploads of an existing artwork land within a
+few bits of the original. The hashes are kept in a multi-index hash table, so a
+lookup compares a handful of candidates instead of every minted hash.
+
+Each process loads the published hashes at startup and then picks up NFTs minted
+elsewhere with a periodic refresh. Hashes of mints in progress in this process are
+reserved right away so two concurrent uploads of the same artwork can't both pass.
+"""
+import asyncio
+import os
+import time
+from itertools import combinations
+from datetime import datetime, timezone, timedelta
+
+
+# Flat or evenly shaded artwork has (almost) no gradients to hash and comes out as
+# nearly all 0 or all 1 bits whatever its colours, such hashes can't tell artworks apart
+MIN_DISTINCT_BITS = 8
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def is_distinctive(value: int) -> bool:
+    ones = bin(value).count('1')
+    return MIN_DISTINCT_BITS <= ones <= 64 - MIN_DISTINCT_BITS
+
+
+class MultiIndexHash:
+    """
+    Multi-index hashing over 64 bit hashes.
+
+    Each hash is split into ``CHUNKS`` 16 bit chunks and every chunk is indexed in
+    its own table. Two hashes within ``d`` bits of each other must have at least one
+    chunk within ``d // CHUNKS`` bits (otherwise every chunk would differ by more and
+    the total would exceed ``d``), so a lookup only has to visit the buckets of the
+    chunk values near the query's and compare the few hashes found there.
+    """
+    CHUNKS = 4
+    CHUNK_BITS = 16
+
+    def __init__(self):
+        self._tables = [{} for _ in range(self.CHUNKS)]  # chunk value -> {nft_id: hash}
+
+    def _chunks(self, value: int):
+        mask = (1 << self.CHUNK_BITS) - 1
+        return [(value >> (index * self.CHUNK_BITS)) & mask for index in range(self.CHUNKS)]
+
+    def add(self, value: int, nft_id: str):
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            table.setdefault(chunk, {})[nft_id] = value
+
+    def discard(self, value: int, nft_id: str):
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            bucket = table.get(chunk)
+            if bucket is not None:
+                bucket.pop(nft_id, None)
+                if not bucket:
+                    del table[chunk]
+
+    def search(self, value: int, max_distance: int) -> list:
+        """Return ``(distance, nft_id)`` for every hash within ``max_distance`` of ``value``."""
+        radius = max_distance // self.CHUNKS
+        # Every chunk value within radius bits of a query chunk
+        flips = [0]
+        for bits in range(1, radius + 1):
+            for positions in combinations(range(self.CHUNK_BITS), bits):
+                flips.append(sum(1 << position for position in positions))
+
+        matches = {}
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            for flip in flips:
+                for nft_id, candidate in table.get(chunk ^ flip, {}).items():
+                    if nft_id not in matches:
+                        distance = hamming(value, candidate)
+                        if distance <= max_distance:
+                            matches[nft_id] = distance
+        return sorted((distance, nft_id) for nft_id, distance in matches.items())
+
+
+class PerceptualIndex:
+    def __init__(self, collection):
+        self.collection = collection
+        self.max_distance = None
+        self.refresh_interval = None
+        self.overlap = None
+        self._table = MultiIndexHash()
+        self._hashes = {}  # nft_id -> hash
+        self._last_refresh = None
+        self._task = None
+        self._stats = {"lookups": 0, "duplicates": 0, "lookup_seconds": 0.0, "load_seconds": None}
+
+    def start(self):
+        self.max_distance = int(os.getenv('DUPLICATE_MAX_DISTANCE', 6))
+        self.refresh_interval = float(os.getenv('DUPLICATE_INDEX_REFRESH', 60))
+        # NFTs are timestamped when their mint starts but only published once the image
+        # is uploaded, mints older than this are abandoned so none can be missed
+        self.overlap = float(os.getenv('MINT_STALE_SECONDS', 3600))
+        # Loading millions of hashes takes a while, mints checked before it finishes
+        # are compared against whatever has been loaded so far
+        self._task = asyncio.create_task(self._refresher())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def refresh(self):
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        query = {"phash": {"$exists": True}, "status": {"$ne": "minting"}}
+        if self._last_refresh is not None:
+            query["timestamp"] = {"$gt": self._last_refresh - timedelta(seconds=self.overlap)}
+
+        scanned = 0
+        async for nft in self.collection.find(query, {"phash": 1}):
+            self.add(str(nft['_id']), nft['phash'])
+            scanned += 1
+            # Give the event loop a turn during the initial load
+            if scanned % 10000 == 0:
+                await asyncio.sleep(0)
+
+        if self._last_refresh is None:
+            self._stats['load_seconds'] = round(time.perf_counter() - started, 3)
+            print(f"Loaded {len(self._hashes)} artwork hashes in {self._stats['load_seconds']}s")
+        self._last_refresh = now
+
+    async def _refresher(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Error refreshing artwork hash index: {str(e)}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def add(self, nft_id: str, phash: str) -> bool:
+        # Idempotent, refreshes overlap and see reserved hashes again once they're published
+        if nft_id in self._hashes:
+            return False
+        value = int(phash, 16)
+        if not is_distinctive(value):
+            return False
+        self._hashes[nft_id] = value
+        self._table.add(value, nft_id)
+        return True
+
+    def remove(self, nft_id: str):
+        value = self._hashes.pop(nft_id, None)
+        if value is not None:
+            self._table.discard(value, nft_id)
+
+    def find_duplicate(self, phash: str):
+        """Return ``(nft_id, distance)`` of the closest indexed artwork within the threshold, or None."""
+        value = int(phash, 16)
+        if not is_distinctive(value):
+            return None
+        started = time.perf_counter()
+        matches = self._table.search(value, self.max_distance)
+        self._stats['lookups'] += 1
+        self._stats['lookup_seconds'] += time.perf_counter() - started
+        if not matches:
+            return None
+        self._stats['duplicates'] += 1
+        distance, nft_id = matches[0]
+        return nft_id, distance
+
+    def reserve(self, nft_id: str, phash: str):
+        """Check a new mint's hash and index it right away. Returns the duplicate found, if any."""
+        duplicate = self.find_duplicate(phash)
+        if duplicate is None:
+            self.add(nft_id, phash)
+        return duplicate
+
+    def metrics(self) -> dict:
+        lookups = self._stats['lookups']
+        return {
+            **self._stats,
+            "lookup_seconds": round(self._stats['lookup_seconds'], 4),
+            "avg_lookup_ms": round(self._stats['lookup_seconds'] * 1000 / lookups, 3) if lookups else None,
+            "hashes": len(self._hashes),
+            "max_distance": self.max_distance,
+            "last_refresh": self._last_refresh.isoformat() if self._last_refresh else None,
+        }
@@ -0,0 +1,251 @@
+"""
+Progressive PNG decoding for reading steganographic payloads without fetching or
+decoding the whole image.
+
+The payload only occupies the leading pixels of the image, so scanlines are
+inflated one at a time as bytes arrive and decoding stops as soon as the
+length-prefixed message is complete. Images the decoder cannot handle raise
+``UnsupportedImageLayout`` so callers can fall back to a full decode.
+"""
+import os
+import struct
+import zlib
+from contextlib import aclosing
+
+import numpy as np
+
+from services import steganography
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Bytes per pixel for the 8-bit colour types the payload can live in (RGB and RGBA)
+SUPPORTED_COLOR_TYPES = {2: 3, 6: 4}
+
+
+class UnsupportedImageLayout(Exception):
+    pass
+
+
+def _paeth(a: int, b: int, c: int) -> int:
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    if pb <= pc:
+        return b
+    return c
+
+
+def _unfilter(filter_type: int, line: np.ndarray, prev: np.ndarray, bpp: int) -> np.ndarray:
+    if filter_type == 0:
+        return line
+    if filter_type == 1:
+        # Sub: each byte adds the reconstructed byte one pixel to the left,
+        # which is a running sum per channel
+        sums = np.cumsum(line.reshape(-1, bpp).astype(np.uint64), axis=0)
+        return (sums & 0xFF).astype(np.uint8).reshape(-1)
+    if filter_type == 2:
+        return line + prev
+
+    # Average and Paeth depend on the byte just reconstructed, so they run sequentially
+    recon = bytearray(line.tobytes())
+    up = prev.tobytes()
+    if filter_type == 3:
+        for i in range(len(recon)):
+            left = recon[i - bpp] if i >= bpp else 0
+            recon[i] = (recon[i] + ((left + up[i]) >> 1)) & 0xFF
+    elif filter_type == 4:
+        for i in range(len(recon)):
+            if i >= bpp:
+                left, upper_left = recon[i - bpp], up[i - bpp]
+            else:
+                left, upper_left = 0, 0
+            recon[i] = (recon[i] + _paeth(left, up[i], upper_left)) & 0xFF
+    else:
+        raise ValueError(f"Invalid PNG filter type: {filter_type}")
+    return np.frombuffer(bytes(recon), dtype=np.uint8)
+
+
+class PngRowDecoder:
+    """
+    Incremental PNG decoder returning scanlines as ``(width, channels)`` arrays.
+
+    Bytes are buffered with ``feed`` and ``rows`` inflates only as much image
+    data as the next scanline needs, so callers can stop after any row.
+    """
+
+    def __init__(self):
+        self.width = None
+        self.height = None
+        self.channels = None
+        self.rows_decoded = 0
+        self._buffer = bytearray()
+        self._signature_checked = False
+        self._inflater = zlib.decompressobj()
+        self._compressed = b''
+        self._idat_remaining = 0
+        self._skip_bytes = 0
+        self._raw = bytearray()
+        self._prev = None
+
+    def feed(self, data: bytes):
+        self._buffer += data
+
+    def rows(self):
+        while True:
+            if self.width is not None and self.rows_decoded < self.height:
+                stride = self.width * self.channels + 1
+                if len(self._raw) >= stride:
+                    yield self._take_row(stride)
+                    continue
+                # Inflate just enough compressed data to complete the next scanline,
+                # zlib may also still hold output from input it already consumed
+                pending = len(self._compressed)
+                inflated = self._inflater.decompress(self._compressed, stride - len(self._raw))
+                self._raw += inflated
+                self._compressed = self._inflater.unconsumed_tail
+                if inflated or len(self._compressed) < pending:
+                    continue
+            if not self._read_chunk():
+                return
+
+    def _read_chunk(self) -> bool:
+        if not self._signature_checked:
+            if len(self._buffer) < len(PNG_SIGNATURE):
+                return False
+            if bytes(self._buffer[:len(PNG_SIGNATURE)]) != PNG_SIGNATURE:
+                raise UnsupportedImageLayout("Not a PNG image")
+            del self._buffer[:len(PNG_SIGNATURE)]
+            self._signature_checked = True
+
+        # IDAT data is passed on as soon as it arrives instead of waiting for the
+        # whole chunk, the image data of a large PNG may be a single huge chunk
+        if self._idat_remaining:
+            if not self._buffer:
+                return False
+            data = bytes(self._buffer[:self._idat_remaining])
+            del self._buffer[:len(data)]
+            self._compressed += data
+            self._idat_remaining -= len(data)
+            if not self._idat_remaining:
+                self._skip_bytes = 4  # crc
+            return True
+        if self._skip_bytes:
+            if len(self._buffer) < self._skip_bytes:
+                return False
+            del self._buffer[:self._skip_bytes]
+            self._skip_bytes = 0
+            return True
+
+        # Chunk layout: length, type, data, crc
+        if len(self._buffer) < 8:
+            return False
+        length, chunk_type = struct.unpack('>I4s', self._buffer[:8])
+        if chunk_type == b'IDAT':
+            if self.width is None:
+                raise ValueError("IDAT chunk before IHDR")
+            del self._buffer[:8]
+            self._idat_remaining = length
+            self._skip_bytes = 4 if length == 0 else 0
+            return True
+
+        if len(self._buffer) < length + 12:
+            return False
+        chunk = bytes(self._buffer[8:8 + length])
+        del self._buffer[:length + 12]
+
+        if chunk_type == b'IHDR':
+            self._read_header(chunk)
+        return True
+
+    def _read_header(self, chunk: bytes):
+        width, height, bit_depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', chunk)
+        if bit_depth != 8 or color_type not in SUPPORTED_COLOR_TYPES or interlace != 0:
+            raise UnsupportedImageLayout(
+                f"Unsupported PNG layout: bit depth {bit_depth}, color type {color_type}, interlace {interlace}"
+            )
+        self.width = width
+        self.height = height
+        self.channels = SUPPORTED_COLOR_TYPES[color_type]
+        self._prev = np.zeros(width * self.channels, dtype=np.uint8)
+
+    def _take_row(self, stride: int) -> np.ndarray:
+        filter_type = self._raw[0]
+        line = np.frombuffer(bytes(self._raw[1:stride]), dtype=np.uint8)
+        del self._raw[:stride]
+
+        recon = _unfilter(filter_type, line, self._prev, self.channels)
+        self._prev = recon
+        self.rows_decoded += 1
+        return recon.reshape(self.width, self.channels)
+
+
+async def reveal_from_chunks(chunks):
+    """Reveal the hidden message from an async iterator of PNG bytes, stopping early."""
+    decoder = PngRowDecoder()
+    rows = []
+    async with aclosing(chunks):
+        async for data in chunks:
+            decoder.feed(data)
+            for row in decoder.rows():
+                rows.append(row)
+                complete = decoder.rows_decoded == decoder.height
+                message = steganography.reveal_array(np.stack(rows), complete=complete)
+                if message is not None:
+                    print(f"Payload found after decoding {decoder.rows_decoded} of {decoder.height} rows")
+                    return message
+
+    if decoder.width is None:
+        raise UnsupportedImageLayout("PNG header not found")
+    raise IndexError("Impossible to detect message.")
+
+
+async def iter_image_bytes(client, url: str):
+    """
+    Yield the leading bytes of a remote image using successive HTTP range requests.
+
+    The first window is ``PARTIAL_FETCH_BYTES`` long and doubles on every further
+    request. Servers that ignore ``Range`` are streamed instead, so closing the
+    iterator still stops the download early.
+    """
+    window = int(os.getenv('PARTIAL_FETCH_BYTES', 65536))
+    start = 0
+    while True:
+        headers = {'Range': f'bytes={start}-{start + window - 1}'}
+        async with client.stream('GET', url, headers=headers) as img_response:
+            if img_response.status_code == 200:
+                async for data in img_response.aiter_bytes():
+                    yield data
+                return
+            if img_response.status_code == 416:
+                return
+            if img_response.status_code != 206:
+                raise Exception("Image could not be retrieved")
+
+            received = 0
+            async for data in img_response.aiter_bytes():
+                received += len(data)
+                yield data
+
+            # Content-Range: bytes <start>-<end>/<total>
+            total = img_response.headers.get('content-range', '').rpartition('/')[2]
+
+        start += received
+        if received < window or (total.isdigit() and start >= int(total)):
+            return
+        window *= 2
+
+
+async def reveal_from_url(client, url: str):
+    return await reveal_from_chunks(iter_image_bytes(client, url))
+
+
+async def _iter_buffer(buffer, chunk_size: int = 65536):
+    for start in range(0, len(buffer), chunk_size):
+        yield buffer[start:start + chunk_size]
+
+
+async def reveal_from_buffer(buffer):
+    # Works on bytes or a memory map of a cached image, only the leading chunks are read
+    return await reveal_from_chunks(_iter_buffer(buffer))
@@ -0,0 +1,184 @@
+"""
+Managed process pool for CPU-bound image and steganography work.
+
+Decoding, LSB embedding/revealing and PNG encoding are moved off the asyncio event
+loop into worker processes. Image bytes are handed to the workers through shared
+memory so multi-megabyte uploads are not pickled on every call.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from typing import NamedTuple, Optional
+
+
+# Marks an attempt whose executor broke before the task could finish
+_LOST = object()
+
+
+class SharedImage(NamedTuple):
+    # Name of the shared memory block holding the encoded image and its length in bytes
+    name: str
+    size: int
+
+
+class ImageTaskTimeout(Exception):
+    pass
+
+
+class ImageWorkerLost(Exception):
+    # The worker pool running a task broke (a worker crashed or was killed) and the
+    # task couldn't be completed on a fresh pool either
+    pass
+
+
+class ImageProcessPool:
+    def __init__(self, workers: Optional[int] = None, task_timeout: Optional[float] = None):
+        self.workers = workers
+        self.task_timeout = task_timeout
+        self._executor = None
+        # Bumped every time the executor is replaced, tasks remember the generation they
+        # were submitted to so a dead executor is only replaced once
+        self._generation = 0
+        self._in_flight = set()  # futures submitted to the current executor
+        self._reapers = {}  # retired executor -> task that terminates it
+        self._stats = {"restarts": 0, "timeouts": 0, "retries": 0}
+        self._retry_lock = asyncio.Lock()
+        # Workers are spawned rather than forked, the parent runs Motor's threads
+        self._context = get_context('spawn')
+
+    def start(self):
+        # Settings are read on start so values loaded from .env are picked up
+        if self.workers is None:
+            self.workers = int(os.getenv('IMAGE_POOL_WORKERS', os.cpu_count() or 1))
+        if self.task_timeout is None:
+            self.task_timeout = float(os.getenv('IMAGE_TASK_TIMEOUT', 60))
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context)
+
+    def stop(self):
+        for executor, reaper in list(self._reapers.items()):
+            reaper.cancel()
+            _terminate(executor)
+        self._reapers.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self._in_flight = set()
+
+    def _replace(self, generation: int, retire: bool = False):
+        # Only the first task to notice a dead or hung executor replaces it, tasks of an
+        # older generation find it already done and just retry on the current one
+        if generation != self._generation or self._executor is None:
+            return
+        executor, in_flight = self._executor, self._in_flight
+        self._executor = None
+        self._in_flight = set()
+        self._generation += 1
+        self._stats['restarts'] += 1
+        self.start()
+
+        if retire:
+            # A task hung: its worker can't be stopped on its own, so the executor stops
+            # taking work and is terminated once its other tasks had their chance to finish
+            executor.shutdown(wait=False, cancel_futures=False)
+            self._reapers[executor] = asyncio.create_task(self._reap(executor, in_flight))
+        else:
+            # Broken executors already failed all their futures
+            executor.shutdown(wait=False, cancel_futures=True)
+            _terminate(executor)
+
+    async def _reap(self, executor, in_flight: set):
+        try:
+            pending = [asyncio.wrap_future(future) for future in list(in_flight) if not future.done()]
+            if pending:
+                await asyncio.wait(pending, timeout=self.task_timeout)
+        finally:
+            # Tasks still running by now are hung too, they fail with BrokenProcessPool
+            # and are retried on the current executor
+            _terminate(executor)
+            self._reapers.pop(executor, None)
+
+    async def run(self, fn, *args, timeout: Optional[float] = None):
+        if self._executor is None:
+            raise RuntimeError("Image process pool is not running")
+
+        timeout = timeout or self.task_timeout
+        result = await self._attempt(fn, args, timeout)
+        if result is _LOST:
+            # Recover and retry once. Retries run one at a time, so a task that crashes
+            # its worker every time can't take the retries of other tasks down with it.
+            async with self._retry_lock:
+                self._stats['retries'] += 1
+                result = await self._attempt(fn, args, timeout)
+            if result is _LOST:
+                raise ImageWorkerLost(f"Image worker lost while running {fn.__name__}")
+        return result
+
+    async def _attempt(self, fn, args: tuple, timeout: float):
+        # Returns the task's result or _LOST when the executor died under it
+        generation = self._generation
+        try:
+            future = self._executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # Broke before this task even got in, e.g. a worker crashed moments ago
+            print(f"Image pool broken before {fn.__name__} could start, restarting pool")
+            self._replace(generation)
+            return _LOST
+        self._in_flight.add(future)
+        future.add_done_callback(self._in_flight.discard)
+
+        wrapped = asyncio.wrap_future(future)
+        try:
+            # wait() doesn't cancel on timeout, so a cancelled future here always means
+            # the executor cancelled it and not that this request was cancelled
+            done, _ = await asyncio.wait({wrapped}, timeout=timeout)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+        if not done:
+            self._stats['timeouts'] += 1
+            if not future.cancel():
+                # Running rather than queued, its worker is stuck
+                print(f"Image task {fn.__name__} timed out after {timeout}s, replacing pool")
+                self._replace(generation, retire=True)
+            raise ImageTaskTimeout(f"Image processing timed out after {timeout} seconds")
+
+        if wrapped.cancelled() or isinstance(wrapped.exception(), BrokenProcessPool):
+            # A worker died, e.g. killed by the OOM killer or while reaping a hung worker
+            print(f"Image worker lost while running {fn.__name__}, restarting pool")
+            self._replace(generation)
+            return _LOST
+        return wrapped.result()
+
+    def metrics(self) -> dict:
+        return {
+            **self._stats,
+            "generation": self._generation,
+            "in_flight": len(self._in_flight),
+            "retiring": len(self._reapers),
+            "workers": self.workers,
+        }
+
+    async def run_with_image(self, fn, image_bytes: bytes, *args, timeout: Optional[float] = None):
+        if not image_bytes:
+            raise ValueError("Empty image data")
+
+        shm = shared_memory.SharedMemory(create=True, size=len(image_bytes))
+        try:
+            shm.buf[:len(image_bytes)] = image_bytes
+            return await self.run(fn, SharedImage(shm.name, len(image_bytes)), *args, timeout=timeout)
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+def _terminate(executor):
+    for process in list((getattr(executor, '_processes', None) or {}).values()):
+        if process.is_alive():
+            process.terminate()
+
+
+image_pool = ImageProcessPool()
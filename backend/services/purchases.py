@@ -0,0 +1,129 @@
+"""
+Atomic NFT purchases.
+
+A purchase moves the NFT to the buyer, moves the price from the buyer to the
+seller, records the transaction and queues the re-watermark job for the new
+owner inside one MongoDB multi-document transaction. Every write is a conditional ``find_one_and_update`` whose filter
+re-checks what the purchase depends on (the NFT is still listed, the buyer
+doesn't own it, the buyer can afford it), so concurrent buyers can't both win
+and a balance can't go negative. Write conflicts between racing purchases abort
+the transaction with a TransientTransactionError, ``with_transaction`` retries
+it and the retried guards then see the committed state.
+"""
+import time
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+
+class PurchaseRejected(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class PurchaseEngine:
+    def __init__(self, client, nfts, users, transactions, watermark_queue):
+        self.client = client
+        self.nfts = nfts
+        self.users = users
+        self.transactions = transactions
+        self.watermark_queue = watermark_queue
+        self._stats = {"purchases": 0, "rejected": 0, "attempts": 0, "total_time": 0.0}
+
+    async def purchase(self, nft_id: str, buyer_id: str, buyer_mail: str) -> dict:
+        """Buy ``nft_id`` for the buyer, raises PurchaseRejected when the purchase isn't possible."""
+        started = time.perf_counter()
+        # Generated up front so a retried transaction records the same purchase
+        transaction_id = ObjectId()
+        timestamp = datetime.now(timezone.utc)
+
+        async def run(session):
+            self._stats['attempts'] += 1
+
+            # Claim the NFT only if it's still listed and the buyer isn't its owner
+            nft = await self.nfts.find_one_and_update(
+                {"_id": ObjectId(nft_id), "status": "active", "owner_mail": {"$ne": buyer_mail}},
+                {"$set": {"owner_mail": buyer_mail, "status": "inactive"}},
+                return_document=ReturnDocument.BEFORE,
+                session=session
+            )
+            if nft is None:
+                raise await self._rejection(nft_id, buyer_mail)
+
+            # Price comes from the database, not from the request
+            price = nft.get('price', 0)
+            seller_mail = nft['owner_mail']
+
+            # Debit the buyer only if the balance covers the price
+            buyer = await self.users.find_one_and_update(
+                {"_id": ObjectId(buyer_id), "balance": {"$gte": price}},
+                {"$inc": {"balance": -price}},
+                projection={"balance": 1},
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            if buyer is None:
+                raise PurchaseRejected("Insufficient balance to purchase this NFT")
+
+            seller = await self.users.find_one_and_update(
+                {"mail": seller_mail},
+                {"$inc": {"balance": price}},
+                projection={"_id": 1},
+                session=session
+            )
+            if seller is None:
+                raise PurchaseRejected("Seller not found", 404)
+
+            await self.transactions.insert_one({
+                "_id": transaction_id,
+                "nft_id": nft_id,
+                "from": seller_mail,
+                "to": buyer_mail,
+                "type": "purchase",
+                "price": price,
+                "timestamp": timestamp
+            }, session=session)
+
+            # The image must follow the new owner, a job written outside the transaction
+            # could be lost to a crash right after the commit
+            await self.watermark_queue.enqueue(nft_id, buyer_mail, str(transaction_id), session=session)
+
+            return {
+                "transaction_id": str(transaction_id),
+                "price": price,
+                "seller_mail": seller_mail,
+                "seller_id": str(seller['_id']),
+                "new_balance": buyer['balance']
+            }
+
+        try:
+            async with await self.client.start_session() as session:
+                result = await session.with_transaction(run)
+        except PurchaseRejected:
+            self._stats['rejected'] += 1
+            raise
+
+        self.watermark_queue.notify()
+        self._stats['purchases'] += 1
+        self._stats['total_time'] += time.perf_counter() - started
+        return result
+
+    async def _rejection(self, nft_id: str, buyer_mail: str) -> PurchaseRejected:
+        # Work out why the NFT guard matched nothing, outside the transaction
+        nft = await self.nfts.find_one({"_id": ObjectId(nft_id)}, {"status": 1, "owner_mail": 1})
+        if nft is None:
+            return PurchaseRejected("NFT not found", 404)
+        if nft.get('owner_mail') == buyer_mail:
+            return PurchaseRejected("You already own this NFT")
+        return PurchaseRejected("This NFT is not available for purchase")
+
+    def metrics(self) -> dict:
+        purchases = self._stats['purchases']
+        return {
+            **self._stats,
+            "total_time": round(self._stats['total_time'], 3),
+            "avg_time": round(self._stats['total_time'] / purchases, 4) if purchases else None,
+        }
@@ -0,0 +1,155 @@
+"""
+LSB steganography engines used for embedding and revealing NFT ownership data.
+
+The NumPy engine works on whole pixel arrays at once and writes exactly the same
+layout as ``stegano.lsb``: the message is prefixed with ``"<length>:"``, every
+character is stored as 8 bits (most significant bit first) and the bits are spread
+over the R, G and B least significant bits of consecutive pixels, row by row.
+Images minted with either engine can be revealed by the other one.
+
+The active engine is selected with the ``STEGO_ENGINE`` environment variable
+(``numpy`` or ``stegano``), defaulting to ``numpy``.
+"""
+import os
+
+import numpy as np
+from PIL import Image
+
+
+ENGINE_NUMPY = 'numpy'
+ENGINE_STEGANO = 'stegano'
+ENGINES = (ENGINE_NUMPY, ENGINE_STEGANO)
+
+# Longest "<length>:" header we are willing to scan for before giving up.
+# 20 digits is far beyond anything that could fit in an image anyway.
+MAX_HEADER_CHARS = 21
+
+
+def get_engine():
+    engine = os.getenv('STEGO_ENGINE', ENGINE_NUMPY).strip().lower()
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown steganography engine: {engine}")
+    return engine
+
+
+def _pixel_view(img_array: np.ndarray) -> np.ndarray:
+    # (height, width, channels) -> (pixels, 3) view over the RGB channels only,
+    # in the same row-major order stegano walks the image in
+    return img_array.reshape(-1, img_array.shape[-1])[:, :3]
+
+
+def _message_bits(message: str) -> np.ndarray:
+    framed = f"{len(message)}:{message}"
+    try:
+        raw = framed.encode('latin-1')
+    except UnicodeEncodeError:
+        # stegano stores one character per 8 bits, anything wider is not representable
+        raise ValueError("Message contains characters that cannot be embedded")
+
+    bits = np.unpackbits(np.frombuffer(raw, dtype=np.uint8))
+    # Pad to a whole number of pixels, just like stegano does
+    padding = (3 - len(bits) % 3) % 3
+    if padding:
+        bits = np.concatenate([bits, np.zeros(padding, dtype=np.uint8)])
+    return bits
+
+
+def required_pixels(message: str) -> int:
+    """Number of pixels needed to hide ``message``, the same for both engines."""
+    return len(_message_bits(message)) // 3
+
+
+def _lsb_bytes(pixels: np.ndarray, pixel_count: int) -> bytes:
+    # Read the RGB least significant bits of the first pixel_count pixels and pack them
+    bits = (pixels[:pixel_count] & 1).reshape(-1)
+    usable = len(bits) - len(bits) % 8
+    return np.packbits(bits[:usable]).tobytes()
+
+
+def hide_array(img_array: np.ndarray, message: str) -> np.ndarray:
+    """Embed ``message`` in place into an RGB/RGBA uint8 array and return it."""
+    if len(message) == 0:
+        raise ValueError("Cannot hide an empty message")
+
+    bits = _message_bits(message)
+    pixels = _pixel_view(img_array)
+    pixel_count = len(bits) // 3
+
+    if pixel_count > pixels.shape[0]:
+        raise ValueError(f"The message you want to hide is too long: {len(message)}")
+
+    target = pixels[:pixel_count]
+    target &= 0xFE
+    target |= bits.reshape(-1, 3)
+    return img_array
+
+
+def reveal_array(img_array: np.ndarray, complete: bool = True):
+    """
+    Reveal a stegano-compatible message from an RGB/RGBA uint8 array.
+
+    When ``complete`` is False the array may only hold the leading pixels of the
+    image; ``None`` is returned if more pixels are needed to finish the message.
+    """
+    pixels = _pixel_view(img_array)
+    available = pixels.shape[0]
+
+    # Decode just enough pixels to find the "<length>:" header
+    header_pixels = min(available, (MAX_HEADER_CHARS * 8 + 2) // 3)
+    header = _lsb_bytes(pixels, header_pixels).decode('latin-1')
+
+    separator = header.find(':')
+    if separator == -1:
+        if not complete and header_pixels == available and (header == '' or header.isdigit()):
+            return None
+        raise IndexError("Impossible to detect message.")
+
+    length_text = header[:separator]
+    if not length_text.isdigit():
+        raise IndexError("Impossible to detect message.")
+    length = int(length_text)
+
+    total_chars = separator + 1 + length
+    pixel_count = (total_chars * 8 + 2) // 3
+    if pixel_count > available:
+        if not complete:
+            return None
+        raise IndexError("image index out of range")
+
+    data = _lsb_bytes(pixels, pixel_count)
+    return data[separator + 1:total_chars].decode('latin-1')
+
+
+def _as_rgb_array(img: Image.Image) -> np.ndarray:
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGB')
+    return np.array(img, dtype=np.uint8)
+
+
+def hide(img: Image.Image, message: str) -> Image.Image:
+    """Return a copy of ``img`` with ``message`` embedded using the active engine."""
+    if get_engine() == ENGINE_STEGANO:
+        from stegano import lsb
+        return lsb.hide(img, message)
+
+    img_array = _as_rgb_array(img)
+    hide_array(img_array, message)
+    return Image.fromarray(img_array)
+
+
+def reveal(img: Image.Image):
+    """Reveal the message hidden in ``img`` using the active engine."""
+    if get_engine() == ENGINE_STEGANO:
+        from stegano import lsb
+        return lsb.reveal(img)
+
+    # The payload lives in the leading pixels, so only convert as many rows as needed
+    # instead of copying the whole canvas into an array
+    rows = 1
+    while True:
+        rows = min(rows, img.height)
+        leading = img.crop((0, 0, img.width, rows))
+        message = reveal_array(_as_rgb_array(leading), complete=rows == img.height)
+        if message is not None:
+            return message
+        rows *= 4
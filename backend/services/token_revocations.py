@@ -0,0 +1,79 @@
+"""
+In-memory token revocation list for stateless token verification.
+
+Each user carries a token generation counter that is embedded in their login
+tokens. Logging out bumps the counter and records the new minimum generation in
+the ``token_revocations`` collection. Every process keeps a copy of the recent
+entries and refreshes it periodically, so verifying a token needs no database access.
+"""
+import asyncio
+import os
+from datetime import datetime, timezone, timedelta
+
+
+class RevocationList:
+    def __init__(self, collection, token_lifetime: float = 86400):
+        self.collection = collection
+        # Entries older than a token's lifetime can't affect any token that is still valid
+        self.token_lifetime = token_lifetime
+        self.refresh_interval = None
+        self._entries = {}  # user_id -> (min_generation, updated_at)
+        self._last_refresh = None
+        self._task = None
+
+    async def start(self):
+        self.refresh_interval = float(os.getenv('TOKEN_REVOCATION_REFRESH', 30))
+        await self.refresh()
+        self._task = asyncio.create_task(self._refresher())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def refresh(self):
+        now = datetime.now(timezone.utc)
+        horizon = now - timedelta(seconds=self.token_lifetime)
+        since = max(self._last_refresh, horizon) if self._last_refresh else horizon
+
+        # Overlap the window a little so writes racing the previous refresh aren't missed
+        async for entry in self.collection.find({'updated_at': {'$gt': since - timedelta(seconds=5)}}):
+            updated_at = entry['updated_at'].replace(tzinfo=timezone.utc)
+            self._apply(entry['_id'], entry['min_generation'], updated_at)
+
+        for user_id in [user_id for user_id, (_, updated_at) in self._entries.items() if updated_at < horizon]:
+            del self._entries[user_id]
+        self._last_refresh = now
+
+    def _apply(self, user_id: str, min_generation: int, updated_at: datetime):
+        current = self._entries.get(user_id)
+        if current is None or min_generation >= current[0]:
+            self._entries[user_id] = (min_generation, updated_at)
+
+    async def _refresher(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Error refreshing token revocation list: {str(e)}")
+
+    async def revoke(self, user_id: str, min_generation: int):
+        now = datetime.now(timezone.utc)
+        await self.collection.update_one(
+            {'_id': user_id},
+            {'$max': {'min_generation': min_generation}, '$set': {'updated_at': now}},
+            upsert=True
+        )
+        self._apply(user_id, min_generation, now)
+
+    def is_revoked(self, user_id: str, generation: int) -> bool:
+        entry = self._entries.get(user_id)
+        return entry is not None and generation < entry[0]
+
+    def metrics(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "last_refresh": self._last_refresh.isoformat() if self._last_refresh else None,
+        }
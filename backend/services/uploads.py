@@ -0,0 +1,83 @@
+"""
+Spooling of uploaded images to temporary files.
+
+Uploads are copied to disk in fixed size chunks while their size is checked, so
+an oversized upload is rejected without ever being held in memory and image
+workers can open the file by path instead of receiving a copy of its bytes.
+"""
+import os
+import shutil
+import tempfile
+import zipfile
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def _spool_file(directory: str = None):
+    return tempfile.NamedTemporaryFile(prefix='upload-', suffix='.img', dir=directory, delete=False)
+
+
+async def spool_upload(upload, max_bytes: int, directory: str = None) -> str:
+    """Copy a FastAPI UploadFile to a temporary file and return its path."""
+    # Starlette knows the size when the part was fully received, fail fast on it
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLarge(f"Upload is {upload.size} bytes, at most {max_bytes} bytes are allowed")
+
+    spooled = _spool_file(directory)
+    written = 0
+    try:
+        with spooled:
+            while chunk := await upload.read(CHUNK_SIZE):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                spooled.write(chunk)
+    except BaseException:
+        remove_spooled(spooled.name)
+        raise
+    return spooled.name
+
+
+def spool_archive(archive_file, max_bytes: int, max_items: int, directory: str = None) -> list:
+    """
+    Extract the images of a zip archive to temporary files.
+
+    Runs on a worker thread. Returns ``(filename, path, error)`` per image where
+    either ``path`` or ``error`` is set.
+    """
+    items = []
+    try:
+        with zipfile.ZipFile(archive_file) as archive:
+            for entry in archive.infolist():
+                filename = entry.filename.rsplit('/', 1)[-1]
+                # Skip folders and hidden or metadata files (e.g. __MACOSX/._name)
+                if entry.is_dir() or not filename or filename.startswith('.') or entry.filename.startswith('__MACOSX'):
+                    continue
+                if len(items) == max_items:
+                    raise ValueError(f"Archive contains more than {max_items} images")
+                if entry.file_size > max_bytes:
+                    items.append((filename, None, f"Upload is {entry.file_size} bytes, at most {max_bytes} bytes are allowed"))
+                    continue
+
+                spooled = _spool_file(directory)
+                with spooled, archive.open(entry) as source:
+                    shutil.copyfileobj(source, spooled, CHUNK_SIZE)
+                items.append((filename, spooled.name, None))
+    except BaseException:
+        for _, path, _ in items:
+            remove_spooled(path)
+        raise
+    return items
+
+
+def remove_spooled(path: str):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,68 @@
+"""
+In-process cache of authenticated user documents keyed by the token's ``_id``.
+
+Concurrent misses for the same user share a single database query. Writes that
+change a user must call ``invalidate`` so the next lookup reloads the document.
+"""
+import asyncio
+
+from services.ttl_cache import TTLCache
+
+
+class _LoaderCancelled(Exception):
+    # Handed to waiters when the request doing the shared load was cancelled
+    pass
+
+
+class UserCache:
+    def __init__(self, max_entries: int = 10000, ttl: float = 30):
+        self._cache = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._inflight = {}  # user_id -> (future, state)
+        self._stats = {"loads": 0, "coalesced": 0}
+
+    async def get(self, user_id: str, loader):
+        """Return the cached user or load it with ``loader()``, a coroutine factory."""
+        user = self._cache.get(user_id)
+        if user is not None:
+            return dict(user)
+
+        if user_id in self._inflight:
+            # Someone is already querying this user, wait for their result
+            self._stats['coalesced'] += 1
+            try:
+                user = await asyncio.shield(self._inflight[user_id][0])
+            except _LoaderCancelled:
+                # Its request went away, not ours, so load the user ourselves
+                return await self.get(user_id, loader)
+            return dict(user) if user is not None else None
+
+        future = asyncio.get_running_loop().create_future()
+        state = {"stale": False}
+        self._inflight[user_id] = (future, state)
+        try:
+            self._stats['loads'] += 1
+            user = await loader()
+        except BaseException as e:
+            # Waiters must always be woken up, a cancelled load makes them retry
+            future.set_exception(e if isinstance(e, Exception) else _LoaderCancelled())
+            # Mark the exception as retrieved, waiters (if any) re-raise it themselves
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(user_id, (None,))[0] is future:
+                del self._inflight[user_id]
+
+        future.set_result(user)
+        # Don't cache a document that was invalidated while it was being loaded
+        if user is not None and not state['stale']:
+            self._cache.set(user_id, user)
+        return dict(user) if user is not None else None
+
+    def invalidate(self, user_id: str):
+        self._cache.invalidate(user_id)
+        inflight = self._inflight.pop(user_id, None)
+        if inflight is not None:
+            inflight[1]['stale'] = True
+
+    def metrics(self) -> dict:
+        return {**self._cache.metrics(), **self._stats, "inflight": len(self._inflight)}
@@ -0,0 +1,162 @@
+"""
+Persistent MongoDB job queue for re-watermarking NFT images after a purchase.
+
+Jobs are written by the purchase transaction itself, so a committed purchase
+always has its job and a rolled back one never does. There is at most one job
+document per ``nft_id``: a new purchase overwrites the pending job so only the
+latest owner gets embedded. Workers claim jobs with a lease, retry failures with
+exponential backoff and record a status clients can poll.
+A job replaced while it runs waits for the running attempt to finish (or for its
+lease to run out) so two workers never re-watermark the same NFT at once.
+"""
+import asyncio
+import os
+from datetime import datetime, timezone, timedelta
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class WatermarkJobQueue:
+    def __init__(self, collection):
+        self.collection = collection
+        self.handler = None
+        self.workers = None
+        self.max_attempts = None
+        self.poll_interval = None
+        self.lease_seconds = None
+        self._tasks = []
+        self._wakeup = None
+
+    def start(self, handler):
+        self.handler = handler
+        self.workers = int(os.getenv('WATERMARK_WORKERS', 2))
+        self.max_attempts = int(os.getenv('WATERMARK_MAX_ATTEMPTS', 5))
+        self.poll_interval = float(os.getenv('WATERMARK_POLL_INTERVAL', 2))
+        self.lease_seconds = float(os.getenv('WATERMARK_LEASE_SECONDS', 300))
+
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(number)) for number in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, nft_id: str, owner_mail: str, transaction_id: str, session=None):
+        """
+        Queue a re-watermark for the NFT's new owner. Pass the purchase's session to write
+        the job inside its transaction, then call ``notify`` once the transaction commits.
+        """
+        now = datetime.now(timezone.utc)
+        # Upsert on nft_id, a newer purchase replaces whatever job was queued before
+        await self.collection.update_one(
+            {"nft_id": nft_id},
+            {
+                "$set": {
+                    "owner_mail": owner_mail,
+                    "transaction_id": transaction_id,
+                    "status": STATUS_PENDING,
+                    "attempts": 0,
+                    "run_after": now,
+                    "updated_at": now,
+                    "last_error": None,
+                },
+                "$setOnInsert": {"created_at": now},
+            },
+            upsert=True,
+            session=session
+        )
+        if session is None:
+            self.notify()
+
+    def notify(self):
+        # Wake an idle worker instead of waiting for the next poll
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def get_status(self, nft_id: str):
+        return await self.collection.find_one({"nft_id": nft_id}, {"_id": 0, "lease_expires": 0, "lease_id": 0})
+
+    async def _claim(self):
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                # Re-queued while a previous attempt still holds the lease: wait for it
+                {"status": STATUS_PENDING, "run_after": {"$lte": now}, "lease_expires": {"$not": {"$gt": now}}},
+                # A worker died while holding the job, take it over once its lease ran out
+                {"status": STATUS_RUNNING, "lease_expires": {"$lte": now}},
+            ]},
+            {"$set": {
+                "status": STATUS_RUNNING,
+                "lease_id": ObjectId(),
+                "lease_expires": now + timedelta(seconds=self.lease_seconds),
+                "updated_at": now,
+            }},
+            sort=[("run_after", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _current(self, job) -> dict:
+        # Only touch the job if no newer purchase replaced it and no other worker took it over
+        return {"_id": job["_id"], "transaction_id": job["transaction_id"], "lease_id": job["lease_id"],
+                "status": STATUS_RUNNING}
+
+    async def _finish(self, job, update: dict):
+        result = await self.collection.update_one(
+            self._current(job),
+            {"$set": update, "$unset": {"lease_id": "", "lease_expires": ""}}
+        )
+        if result.matched_count == 0:
+            # Replaced while running, release our lease so the newer job can be claimed now
+            released = await self.collection.update_one(
+                {"_id": job["_id"], "lease_id": job["lease_id"]},
+                {"$unset": {"lease_id": "", "lease_expires": ""}}
+            )
+            if released.modified_count:
+                self.notify()
+
+    async def _run(self, job):
+        try:
+            await self.handler(job)
+        except Exception as e:
+            attempts = job.get('attempts', 0) + 1
+            now = datetime.now(timezone.utc)
+            print(f"Watermark job for NFT {job['nft_id']} failed (attempt {attempts}): {str(e)}")
+            if attempts >= self.max_attempts:
+                update = {"status": STATUS_FAILED}
+            else:
+                delay = min(2 ** attempts * 5, 3600)
+                update = {"status": STATUS_PENDING, "run_after": now + timedelta(seconds=delay)}
+            update.update({"attempts": attempts, "last_error": str(e), "updated_at": now})
+            await self._finish(job, update)
+            return
+
+        now = datetime.now(timezone.utc)
+        await self._finish(job, {"status": STATUS_DONE, "completed_at": now, "updated_at": now, "last_error": None})
+
+    async def _worker(self, number: int):
+        while True:
+            try:
+                job = await self._claim()
+                if job is None:
+                    # Sleep until the next poll or until a purchase enqueues a job
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Watermark worker {number} error: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,273 @@
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+from urllib.parse import urlsplit, parse_qs
+
+import cloudinary
+import cloudinary.utils
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+# Tests import the backend modules the same way main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# A local mongod for tests that need real MongoDB behaviour, e.g.
+# MONGO_TEST_URI="mongodb://localhost:27017/?replicaSet=rs0"
+MONGO_TEST_URI = os.getenv('MONGO_TEST_URI', 'mongodb://localhost:27017/')
+
+
+def _server_info(uri: str):
+    try:
+        with MongoClient(uri, serverSelectionTimeoutMS=1000) as client:
+            return client.admin.command('hello')
+    except PyMongoError:
+        return None
+
+
+@pytest.fixture
+def mongo_database():
+    """(uri, database name) of a scratch database on a local mongod, dropped afterwards."""
+    if _server_info(MONGO_TEST_URI) is None:
+        pytest.skip(f"No mongod reachable at {MONGO_TEST_URI}")
+    name = f"stegavault_test_{uuid.uuid4().hex[:8]}"
+    yield MONGO_TEST_URI, name
+    with MongoClient(MONGO_TEST_URI) as client:
+        client.drop_database(name)
+
+
+def _import_main(monkeypatch, uri: str, name: str):
+    # main connects and configures itself at import time, from the environment
+    monkeypatch.setenv('MONGO_URI', uri)
+    monkeypatch.setenv('DB_NAME', name)
+    monkeypatch.setenv('JWT_KEY', 'test-key')
+    # Keep main's Cloudinary credentials from replacing the ones a test configured
+    config = vars(cloudinary.config()).copy()
+    sys.modules.pop('main', None)
+    module = importlib.import_module('main')
+    vars(cloudinary.config()).clear()
+    vars(cloudinary.config()).update(config)
+    return module
+
+
+@pytest.fixture
+def app_module(monkeypatch):
+    """A freshly imported ``main`` whose Motor client is never used, for tests of its helpers."""
+    yield _import_main(monkeypatch, MONGO_TEST_URI, 'stegavault_unused')
+    sys.modules.pop('main', None)
+
+
+@pytest.fixture
+def app_with_database(mongo_database, monkeypatch):
+    """A freshly imported ``main`` using the scratch database of ``mongo_database``."""
+    module = _import_main(monkeypatch, *mongo_database)
+    yield module
+    module.client.close()
+    sys.modules.pop('main', None)
+
+
+@pytest.fixture
+def replica_set_database(mongo_database):
+    """Like ``mongo_database`` but skips unless the mongod is part of a replica set."""
+    info = _server_info(mongo_database[0])
+    if not info or not info.get('setName'):
+        pytest.skip("Multi-document transactions need a replica set")
+    return mongo_database
+
+
+class LocalRequest(NamedTuple):
+    method: str
+    path: str
+    query: dict
+    headers: dict
+    body: bytes
+
+
+class LocalHttpServer:
+    """
+    HTTP/1.1 server on a background thread standing in for Cloudinary and other remotes.
+
+    Tests set ``routes[(method, path)]`` to a function taking a ``LocalRequest`` and
+    returning ``(status, headers, body)``. A body that isn't bytes is iterated and
+    sent chunked. Every request is recorded in ``requests``, every accepted TCP
+    connection is counted in ``connections``.
+    """
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.connections = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self):
+                parts = urlsplit(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                request = LocalRequest(self.command, parts.path, parse_qs(parts.query),
+                                       {name.lower(): value for name, value in self.headers.items()},
+                                       self.rfile.read(length) if length else b'')
+                server.requests.append(request)
+                route = server.routes.get((self.command, parts.path))
+                status, headers, body = route(request) if route else (404, {}, b'Not found')
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if isinstance(body, bytes):
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for data in body:
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            do_GET = do_POST = _dispatch
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}{path}"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def http_server():
+    server = LocalHttpServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+class FakeCloudinary:
+    """
+    Cloudinary upload and destroy endpoints on a ``LocalHttpServer``.
+
+    Signatures are checked like Cloudinary does. Uploaded files are kept in
+    ``assets`` by public id, ``failures`` holds statuses to answer the next uploads
+    with (e.g. ``[503]``), uploads to a public id in ``rejected`` are refused with a
+    400 and ``delay`` slows every upload down. Destroyed public ids are recorded in
+    ``destroyed``.
+    """
+    CLOUD_NAME = 'test'
+    API_KEY = 'test-key'
+    API_SECRET = 'test-secret'
+
+    def __init__(self, server: LocalHttpServer):
+        self.server = server
+        self.assets = {}
+        self.failures = []
+        self.rejected = set()
+        self.destroyed = []
+        self.delay = 0.0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        server.routes[('POST', f'/v1_1/{self.CLOUD_NAME}/image/upload')] = self._upload
+        server.routes[('POST', f'/v1_1/{self.CLOUD_NAME}/image/destroy')] = self._destroy
+
+    @property
+    def upload_url(self) -> str:
+        return self.server.url(f'/v1_1/{self.CLOUD_NAME}/image/upload')
+
+    def uploads(self) -> list:
+        return [request for request in self.server.requests if request.path.endswith('/upload')]
+
+    def _form(self, request) -> tuple:
+        if request.headers.get('content-type', '').startswith('multipart/form-data'):
+            message = BytesParser(policy=policy.HTTP).parsebytes(
+                f"Content-Type: {request.headers['content-type']}\r\n\r\n".encode() + request.body
+            )
+            fields, files = {}, {}
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                if part.get_filename() is not None:
+                    files[name] = part.get_payload(decode=True)
+                else:
+                    fields[name] = part.get_content()
+            return fields, files
+        return {name: values[0] for name, values in parse_qs(request.body.decode()).items()}, {}
+
+    def _signed(self, fields: dict) -> bool:
+        params = {name: value for name, value in fields.items() if name not in ('signature', 'api_key')}
+        return fields.get('api_key') == self.API_KEY and \
+            fields.get('signature') == cloudinary.utils.api_sign_request(params, self.API_SECRET)
+
+    def _reply(self, status: int, body: dict):
+        return status, {'Content-Type': 'application/json'}, json.dumps(body).encode()
+
+    def _upload(self, request):
+        fields, files = self._form(request)
+        if not self._signed(fields):
+            return self._reply(401, {"error": {"message": "Invalid Signature"}})
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            failure = self.failures.pop(0) if self.failures else None
+        try:
+            time.sleep(self.delay)
+        finally:
+            with self._lock:
+                self.active -= 1
+        public_id = '/'.join(part for part in (fields.get('folder'), fields.get('public_id')) if part)
+        if public_id in self.rejected:
+            failure = 400
+        if failure:
+            return self._reply(failure, {"error": {"message": f"Failed with {failure}"}})
+
+        self.assets[public_id] = files['file']
+        return self._reply(200, {
+            "public_id": public_id,
+            "version": 1,
+            "bytes": len(files['file']),
+            "secure_url": self.server.url(f'/{self.CLOUD_NAME}/image/upload/v1/{public_id}.png'),
+        })
+
+    def _destroy(self, request):
+        fields, _ = self._form(request)
+        if not self._signed(fields):
+            return self._reply(401, {"error": {"message": "Invalid Signature"}})
+        self.destroyed.append(fields.get('public_id'))
+        found = self.assets.pop(fields.get('public_id'), None) is not None
+        return self._reply(200, {"result": "ok" if found else "not found"})
+
+
+@pytest.fixture
+def fake_cloudinary(http_server, monkeypatch):
+    """Points uploads at a ``FakeCloudinary`` through CLOUDINARY_UPLOAD_URL."""
+    fake = FakeCloudinary(http_server)
+    config = cloudinary.config()
+    monkeypatch.setattr(config, 'cloud_name', fake.CLOUD_NAME, raising=False)
+    monkeypatch.setattr(config, 'api_key', fake.API_KEY, raising=False)
+    monkeypatch.setattr(config, 'api_secret', fake.API_SECRET, raising=False)
+    monkeypatch.setenv('CLOUDINARY_UPLOAD_URL', fake.upload_url)
+    monkeypatch.setenv('STORAGE_UPLOAD_BACKOFF', '0.01')
+    return fake
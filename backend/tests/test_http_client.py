@@ -0,0 +1,164 @@
+"""
+Pooled HTTP client and partial image fetch tests against a local HTTP server.
+"""
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from services import png_stream, steganography
+from services.http_client import PooledHttpClient, ResponseTooLarge
+
+
+def _png(message: str, size: int = 300) -> bytes:
+    # Noise doesn't compress, so the payload rows take up a predictable share of the file
+    pixels = np.random.default_rng(7).integers(0, 256, (size, size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    steganography.hide(Image.fromarray(pixels), message).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def _ranged(data: bytes):
+    # Serves single byte ranges the way Cloudinary's CDN does
+    def route(request):
+        spec = request.headers.get('range')
+        if not spec:
+            return 200, {}, data
+        start, end = (int(value) for value in spec.removeprefix('bytes=').split('-'))
+        if start >= len(data):
+            return 416, {'Content-Range': f'bytes */{len(data)}'}, b''
+        end = min(end, len(data) - 1)
+        return 206, {'Content-Range': f'bytes {start}-{end}/{len(data)}'}, data[start:end + 1]
+    return route
+
+
+async def _started_client() -> PooledHttpClient:
+    client = PooledHttpClient()
+    await client.start()
+    return client
+
+
+def test_connections_are_reused(http_server):
+    body = b'x' * 10000
+    http_server.routes[('GET', '/image.png')] = lambda request: (200, {}, body)
+
+    async def scenario():
+        client = await _started_client()
+        try:
+            for _ in range(5):
+                assert await client.get_bytes(http_server.url('/image.png')) == body
+            metrics = client.metrics()
+        finally:
+            await client.stop()
+        assert metrics['requests'] == 5
+        assert metrics['new_connections'] == 1
+        assert metrics['reused_connections'] == 4
+        assert metrics['reuse_ratio'] == 0.8
+        assert metrics['bytes_received'] == 5 * len(body)
+        assert metrics['errors'] == 0
+
+    asyncio.run(scenario())
+    assert http_server.connections == 1
+
+
+def test_oversized_responses_are_rejected(http_server, monkeypatch):
+    monkeypatch.setenv('HTTP_MAX_RESPONSE_BYTES', '1000')
+    http_server.routes[('GET', '/declared.png')] = lambda request: (200, {}, b'x' * 5000)
+    # No Content-Length, the limit has to be enforced while streaming
+    http_server.routes[('GET', '/chunked.png')] = lambda request: (200, {}, (b'x' * 500 for _ in range(10)))
+    http_server.routes[('GET', '/small.png')] = lambda request: (200, {}, (b'x' * 500 for _ in range(2)))
+
+    async def scenario():
+        client = await _started_client()
+        try:
+            with pytest.raises(ResponseTooLarge):
+                await client.get_bytes(http_server.url('/declared.png'))
+            with pytest.raises(ResponseTooLarge):
+                await client.get_bytes(http_server.url('/chunked.png'))
+            assert await client.get_bytes(http_server.url('/small.png')) == b'x' * 1000
+            metrics = client.metrics()
+        finally:
+            await client.stop()
+        assert metrics['rejected_too_large'] == 2
+        assert metrics['errors'] == 2
+        assert metrics['bytes_received'] == 1000
+
+    asyncio.run(scenario())
+
+
+def test_failed_fetches_raise(http_server):
+    async def scenario():
+        client = await _started_client()
+        try:
+            with pytest.raises(Exception, match="could not be retrieved"):
+                await client.get_bytes(http_server.url('/missing.png'))
+            assert client.metrics()['errors'] == 1
+        finally:
+            await client.stop()
+
+    asyncio.run(scenario())
+
+
+def test_partial_reveal_fetches_only_the_leading_bytes(http_server, monkeypatch):
+    monkeypatch.setenv('PARTIAL_FETCH_BYTES', '4096')
+    message = 'ownership payload ' * 4
+    image = _png(message)
+    http_server.routes[('GET', '/nft.png')] = _ranged(image)
+
+    async def scenario():
+        client = await _started_client()
+        try:
+            return await png_stream.reveal_from_url(client, http_server.url('/nft.png'))
+        finally:
+            await client.stop()
+
+    assert asyncio.run(scenario()) == message
+    # The payload sits in the first rows, one window is enough
+    assert [request.headers['range'] for request in http_server.requests] == ['bytes=0-4095']
+
+
+def test_partial_reveal_doubles_the_window(http_server, monkeypatch):
+    monkeypatch.setenv('PARTIAL_FETCH_BYTES', '4096')
+    # Fills a bit over half of the image's rows
+    message = 'x' * 20000
+    image = _png(message)
+    http_server.routes[('GET', '/nft.png')] = _ranged(image)
+
+    async def scenario():
+        client = await _started_client()
+        try:
+            revealed = await png_stream.reveal_from_url(client, http_server.url('/nft.png'))
+            return revealed, client.metrics()
+        finally:
+            await client.stop()
+
+    revealed, metrics = asyncio.run(scenario())
+    assert revealed == message
+
+    ranges = [request.headers['range'] for request in http_server.requests]
+    start, window = 0, 4096
+    for spec in ranges:
+        assert spec == f'bytes={start}-{start + window - 1}'
+        start, window = start + window, window * 2
+    assert 1 < len(ranges) < 7
+    # Stopped before the end of the image, on one kept-alive connection
+    assert start < len(image)
+    assert metrics['new_connections'] == 1
+
+
+def test_partial_reveal_streams_when_ranges_are_ignored(http_server, monkeypatch):
+    monkeypatch.setenv('PARTIAL_FETCH_BYTES', '4096')
+    message = 'ownership payload'
+    http_server.routes[('GET', '/nft.png')] = lambda request: (200, {}, _png(message))
+
+    async def scenario():
+        client = await _started_client()
+        try:
+            return await png_stream.reveal_from_url(client, http_server.url('/nft.png'))
+        finally:
+            await client.stop()
+
+    assert asyncio.run(scenario()) == message
+    assert len(http_server.requests) == 1
@@ -0,0 +1,105 @@
+"""
+Encoding profile tests and a benchmark of encode time, size and upload time per profile.
+
+Uploads go to the local fake Cloudinary endpoint. Run with ``-s`` to see the numbers.
+"""
+import asyncio
+import io
+import statistics
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from services import image_tasks, steganography
+from services.http_client import http_client
+from services.storage import CloudinaryStorage
+
+
+PAYLOAD = 'ownership payload'
+
+
+def _artwork(size: int = 1024) -> Image.Image:
+    # Smooth shapes with some grain, closer to real artwork than flat colour or pure noise
+    rng = np.random.default_rng(21)
+    y, x = np.mgrid[0:size, 0:size] / size
+    channels = [np.sin(x * rng.uniform(2, 9) + y * rng.uniform(2, 9)) for _ in range(3)]
+    pixels = (np.stack(channels, axis=-1) + 1) * 110 + rng.normal(0, 6, (size, size, 3))
+    return steganography.hide(Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)), PAYLOAD)
+
+
+def test_unknown_profile_fails_the_settings_check(monkeypatch):
+    monkeypatch.setenv('IMAGE_ENCODING_PROFILE', 'balnced')
+    with pytest.raises(ValueError, match="balnced"):
+        image_tasks.check_settings()
+    monkeypatch.setenv('IMAGE_ENCODING_PROFILE', ' WebP ')
+    image_tasks.check_settings()
+
+
+def test_unknown_steganography_engine_fails_the_settings_check(monkeypatch):
+    monkeypatch.setenv('STEGO_ENGINE', 'lsb')
+    with pytest.raises(ValueError):
+        image_tasks.check_settings()
+
+
+def test_app_refuses_to_start_with_an_unknown_profile(app_module, monkeypatch):
+    monkeypatch.setenv('IMAGE_ENCODING_PROFILE', 'balnced')
+
+    async def scenario():
+        async with app_module.lifespan(app_module.app):
+            pass
+
+    with pytest.raises(ValueError, match="balnced"):
+        asyncio.run(scenario())
+    # Nothing was started before the check
+    assert app_module.image_pool.metrics()['workers'] is None
+
+
+def test_webp_falls_back_to_png_for_large_canvases():
+    encoded = image_tasks.encode_image(Image.new('RGB', (image_tasks.WEBP_MAX_DIMENSION + 1, 2)), 'webp')
+    assert Image.open(io.BytesIO(encoded)).format == 'PNG'
+
+
+def test_encoding_profiles_benchmark(fake_cloudinary):
+    img = _artwork()
+    expected = np.asarray(img)
+    results = {}
+
+    async def upload_all(encoded: dict):
+        await http_client.start()
+        storage = CloudinaryStorage()
+        storage.start()
+        try:
+            timings = {}
+            for profile, data in encoded.items():
+                started = time.perf_counter()
+                await storage.upload(data, folder='nft_images', public_id=f'benchmark_{profile}')
+                timings[profile] = time.perf_counter() - started
+            return timings
+        finally:
+            await http_client.stop()
+
+    encoded = {}
+    for profile in image_tasks.ENCODING_PROFILES:
+        samples = []
+        for _ in range(3):
+            started = time.perf_counter()
+            encoded[profile] = image_tasks.encode_image(img, profile)
+            samples.append(time.perf_counter() - started)
+        results[profile] = statistics.median(samples)
+
+        # Every profile is lossless, the payload must survive it
+        decoded = Image.open(io.BytesIO(encoded[profile])).convert('RGB')
+        assert np.array_equal(np.asarray(decoded), expected)
+        assert steganography.reveal(decoded) == PAYLOAD
+
+    uploads = asyncio.run(upload_all(encoded))
+    assert set(fake_cloudinary.assets) == {f'nft_images/benchmark_{profile}' for profile in encoded}
+
+    print()
+    print(f"{'profile':>10} {'encode ms':>10} {'bytes':>10} {'upload ms':>10}")
+    for profile in image_tasks.ENCODING_PROFILES:
+        print(f"{profile:>10} {results[profile] * 1000:>10.1f} {len(encoded[profile]):>10} {uploads[profile] * 1000:>10.1f}")
+
+    assert len(encoded['archival']) <= len(encoded['balanced']) <= len(encoded['fast'])
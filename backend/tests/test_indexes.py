@@ -0,0 +1,80 @@
+"""
+Index reconciliation and query plan tests against a local mongod (MONGO_TEST_URI).
+
+Skipped when no mongod is reachable, explain output and index build failures
+can't be reproduced by an in-memory MongoDB.
+"""
+import asyncio
+
+import motor.motor_asyncio
+
+from services.indexes import IndexRegistry
+
+
+async def _indexes(collection) -> dict:
+    return {index['name']: index async for index in collection.list_indexes()}
+
+
+def test_failed_rebuild_keeps_the_previous_index(mongo_database):
+    async def scenario():
+        uri, name = mongo_database
+        client = motor.motor_asyncio.AsyncIOMotorClient(uri)
+        try:
+            users = client[name]['users']
+            # Duplicate mails block the unique index the registry declares
+            await users.insert_many([{"mail": "a@b.c"}, {"mail": "a@b.c"}, {"mail": "d@e.f"}])
+            await users.create_index("mail", name="mail_1")
+
+            registry = IndexRegistry()
+            registry.index(users, "mail", unique=True)
+            await registry.reconcile()
+
+            indexes = await _indexes(users)
+            assert registry.metrics()['failed'] == 1
+            assert set(indexes) == {"_id_", "mail_1"}
+            assert not indexes["mail_1"].get("unique")
+
+            # Once the duplicates are gone the rebuild goes through
+            await users.delete_one({"mail": "a@b.c"})
+            registry = IndexRegistry()
+            registry.index(users, "mail", unique=True)
+            await registry.reconcile()
+
+            indexes = await _indexes(users)
+            assert registry.metrics()['rebuilt'] == 1
+            assert set(indexes) == {"_id_", "mail_1"}
+            assert indexes["mail_1"].get("unique")
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
+
+
+def test_reconcile_is_idempotent(mongo_database):
+    async def scenario():
+        uri, name = mongo_database
+        client = motor.motor_asyncio.AsyncIOMotorClient(uri)
+        try:
+            nfts = client[name]['nfts']
+            for _ in range(2):
+                registry = IndexRegistry()
+                registry.index(nfts, [("status", 1), ("timestamp", -1), ("_id", -1)])
+                registry.index(nfts, [("timestamp", 1)], partialFilterExpression={"phash": {"$exists": True}})
+                await registry.reconcile()
+            assert registry.metrics()['unchanged'] == 2
+            assert len(await _indexes(nfts)) == 3
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
+
+
+def test_hot_queries_use_indexes(app_with_database):
+    main = app_with_database
+
+    async def scenario():
+        await main.index_registry.reconcile()
+        # Raises IndexPlanError listing every registered query shape that does a COLLSCAN
+        await main.index_registry.assert_query_plans()
+
+    asyncio.run(scenario())
@@ -0,0 +1,189 @@
+"""
+Mailer tests against a local aiosmtpd server standing in for the SMTP relay.
+"""
+import asyncio
+import socket
+import time
+from email.message import EmailMessage
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from services.mailer import Mailer
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        # DATA replies to send before accepting, e.g. ['451 Try again later']
+        self.rejections = []
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.rejections:
+            return self.rejections.pop(0)
+        self.messages.append(envelope)
+        return '250 OK'
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class LocalSmtpServer:
+    def __init__(self):
+        self.handler = RecordingHandler()
+        self.port = _free_port()
+        self._controller = None
+
+    def start(self):
+        self._controller = Controller(self.handler, hostname='127.0.0.1', port=self.port)
+        self._controller.start()
+
+    def stop(self):
+        self._controller.stop()
+
+    def restart(self):
+        # Drops every open connection, a stopped controller can't be started again
+        self.stop()
+        self.start()
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    server = LocalSmtpServer()
+    server.start()
+    monkeypatch.setenv('SMTP_HOST', '127.0.0.1')
+    monkeypatch.setenv('SMTP_PORT', str(server.port))
+    monkeypatch.setenv('SMTP_STARTTLS', 'false')
+    monkeypatch.setenv('MAIL_RETRY_BACKOFF', '0.01')
+    monkeypatch.delenv('EMAIL', raising=False)
+    monkeypatch.delenv('EMAIL_PASSWORD', raising=False)
+    yield server
+    server.stop()
+
+
+def _message(index: int) -> EmailMessage:
+    message = EmailMessage()
+    message['Subject'] = f'Message {index}'
+    message['From'] = 'vault@example.com'
+    message['To'] = f'user{index}@example.com'
+    message.set_content('Hello')
+    return message
+
+
+async def _wait_for(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the mailer"
+        await asyncio.sleep(0.02)
+
+
+def test_queued_messages_share_one_connection(smtp_server):
+    handler = smtp_server.handler
+
+    async def scenario():
+        mailer = Mailer()
+        mailer.start()
+        try:
+            for index in range(10):
+                mailer.send(_message(index))
+            await _wait_for(lambda: mailer.metrics()['sent'] == 10)
+            metrics = mailer.metrics()
+            assert metrics['connections'] == 1
+            assert metrics['batches'] == 1
+            assert metrics['pending'] == 0
+            assert sorted(envelope.rcpt_tos[0] for envelope in handler.messages) == \
+                sorted(f'user{index}@example.com' for index in range(10))
+        finally:
+            await mailer.stop()
+        assert not mailer.metrics()['connected']
+
+    asyncio.run(scenario())
+
+
+def test_reconnects_when_the_kept_connection_is_dropped(smtp_server):
+    handler = smtp_server.handler
+
+    async def scenario():
+        mailer = Mailer()
+        mailer.start()
+        try:
+            mailer.send(_message(0))
+            await _wait_for(lambda: mailer.metrics()['sent'] == 1)
+
+            # Restart the server, the mailer's open connection goes stale
+            await asyncio.to_thread(smtp_server.restart)
+
+            mailer.send(_message(1))
+            await _wait_for(lambda: mailer.metrics()['sent'] == 2)
+            assert mailer.metrics()['connections'] == 2
+            assert mailer.metrics()['failed'] == 0
+            assert len(handler.messages) == 2
+        finally:
+            await mailer.stop()
+
+    asyncio.run(scenario())
+
+
+def test_temporary_failures_are_retried(smtp_server):
+    handler = smtp_server.handler
+    handler.rejections = ['451 Try again later', '451 Try again later']
+
+    async def scenario():
+        mailer = Mailer()
+        mailer.start()
+        try:
+            mailer.send(_message(0))
+            await _wait_for(lambda: mailer.metrics()['sent'] == 1)
+            metrics = mailer.metrics()
+            assert metrics['retries'] == 2
+            assert metrics['failed'] == 0
+            assert metrics['scheduled_retries'] == 0
+            # A rejected message is not a dropped connection
+            assert metrics['connections'] == 1
+        finally:
+            await mailer.stop()
+
+    asyncio.run(scenario())
+
+
+def test_gives_up_after_max_retries(smtp_server, monkeypatch):
+    handler = smtp_server.handler
+    handler.rejections = ['550 Mailbox unavailable'] * 10
+    monkeypatch.setenv('MAIL_MAX_RETRIES', '2')
+
+    async def scenario():
+        mailer = Mailer()
+        mailer.start()
+        try:
+            mailer.send(_message(0))
+            await _wait_for(lambda: mailer.metrics()['failed'] == 1)
+            metrics = mailer.metrics()
+            assert metrics['sent'] == 0
+            assert metrics['retries'] == 2
+            assert handler.messages == []
+        finally:
+            await mailer.stop()
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_reported_to_the_caller(smtp_server, monkeypatch):
+    monkeypatch.setenv('MAIL_QUEUE_SIZE', '2')
+
+    async def scenario():
+        mailer = Mailer()
+        mailer.start()
+        try:
+            # The sender hasn't had a turn yet, so nothing has been taken off the queue
+            mailer.send(_message(0))
+            mailer.send(_message(1))
+            with pytest.raises(asyncio.QueueFull):
+                mailer.send(_message(2))
+            assert mailer.metrics()['queued'] == 2
+        finally:
+            await mailer.stop()
+
+    asyncio.run(scenario())
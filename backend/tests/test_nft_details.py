@@ -0,0 +1,101 @@
+"""
+Latency benchmark for /getNftDetails against a local mongod (MONGO_TEST_URI).
+
+Reports p50/p99 of the endpoint for an NFT with a long transaction history and
+checks the p99 against NFT_DETAILS_P99_BUDGET (seconds). Run with ``-s`` to see
+the numbers.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timezone, timedelta
+
+import httpx
+import jwt
+from bson import ObjectId
+
+
+HISTORY = 500
+OTHER_TRANSACTIONS = 20000
+REQUESTS = 300
+
+
+async def _seed(main):
+    now = datetime.now(timezone.utc)
+    await main.users.insert_many([
+        {"name": "Publisher", "mail": "publisher@example.com", "balance": 0},
+        {"name": "Owner", "mail": "owner@example.com", "balance": 0},
+    ])
+    nft_id = ObjectId()
+    await main.nfts.insert_one({
+        "_id": nft_id, "name": "Benchmark", "price": 10, "status": "active",
+        "publisher_mail": "publisher@example.com", "owner_mail": "owner@example.com",
+        "image_url": "https://example.com/nft.png", "timestamp": now
+    })
+    await main.transactions.insert_many([
+        {"nft_id": str(nft_id), "type": "purchase", "from": f"seller{index}@example.com",
+         "to": f"buyer{index}@example.com", "price": 10, "timestamp": now - timedelta(minutes=index)}
+        for index in range(HISTORY)
+    ])
+    # Other NFTs' history the index has to skip over
+    await main.transactions.insert_many([
+        {"nft_id": str(ObjectId()), "type": "purchase", "from": "a@example.com", "to": "b@example.com",
+         "price": 10, "timestamp": now - timedelta(seconds=index)}
+        for index in range(OTHER_TRANSACTIONS)
+    ])
+    return str(nft_id)
+
+
+def _token() -> str:
+    issued_at = datetime.now(timezone.utc).timestamp()
+    return jwt.encode({
+        "_id": str(ObjectId()), "mail": "viewer@example.com", "iat": int(issued_at), "gen": 0,
+        "validTill": issued_at + 86400
+    }, os.getenv('JWT_KEY'), algorithm="HS256")
+
+
+def _percentile(samples: list, percentile: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+
+def test_nft_details_latency(app_with_database):
+    main = app_with_database
+    budget = float(os.getenv('NFT_DETAILS_P99_BUDGET', 0.1))
+
+    async def scenario():
+        nft_id = await _seed(main)
+        await main.index_registry.reconcile()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = {"auth_token": _token()}
+
+            # The capped history pages through every transaction exactly once
+            seen = []
+            cursor = None
+            while True:
+                page = (await client.post('/getNftDetails', headers=headers, json={
+                    "nft_id": nft_id, "transactions_limit": 100, "transactions_cursor": cursor
+                })).json()
+                assert page['success']
+                seen += [transaction['_id'] for transaction in page['transactions']]
+                cursor = page['transactions_pagination']['next_cursor']
+                if cursor is None:
+                    break
+            assert len(seen) == len(set(seen)) == HISTORY
+
+            latencies = []
+            for _ in range(REQUESTS):
+                started = time.perf_counter()
+                details = (await client.post('/getNftDetails', headers=headers, json={"nft_id": nft_id})).json()
+                latencies.append(time.perf_counter() - started)
+            assert details['publisher']['name'] == "Publisher"
+            assert details['owner']['name'] == "Owner"
+            assert len(details['transactions']) == 20
+            assert details['transactions_pagination']['has_more']
+        return latencies
+
+    latencies = asyncio.run(scenario())
+    p50, p99 = _percentile(latencies, 0.5), _percentile(latencies, 0.99)
+    print(f"getNftDetails over {REQUESTS} requests: p50 {p50 * 1000:.2f}ms, p99 {p99 * 1000:.2f}ms")
+    assert p99 < budget
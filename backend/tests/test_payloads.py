@@ -0,0 +1,143 @@
+"""
+Ownership payload format tests and an embed/extract benchmark by payload size.
+
+Run with ``-s`` to see the benchmark numbers.
+"""
+import asyncio
+import base64
+import io
+import statistics
+import time
+
+import jwt
+import numpy as np
+import pytest
+from bson import ObjectId
+from PIL import Image
+
+from services import payloads, png_stream, steganography
+
+
+KEY = 'test-key'
+NFT_ID = str(ObjectId())
+TRANSACTION_ID = str(ObjectId())
+OWNER = 'Owner@Example.com'
+
+
+def _tampered(payload: str, position: int) -> str:
+    raw = bytearray(base64.b85decode(payload))
+    raw[position] ^= 0x01
+    return base64.b85encode(bytes(raw)).decode('ascii')
+
+
+def test_compact_payload_round_trip():
+    payload = payloads.encode_payload(NFT_ID, TRANSACTION_ID, OWNER, KEY)
+    assert len(payload) == 62
+    assert payloads.is_compact(payload)
+
+    decoded = payloads.decode_payload(payload, KEY)
+    assert decoded['version'] == payloads.VERSION
+    assert decoded['data']['nft_id'] == NFT_ID
+    assert decoded['data']['transaction_id'] == TRANSACTION_ID
+    # The mail itself is not in the image, only a keyed reference to it
+    assert OWNER.lower() not in payload.lower()
+    assert payloads.owner_matches(decoded['data'], 'owner@example.com', KEY)
+    assert not payloads.owner_matches(decoded['data'], 'someone@example.com', KEY)
+    assert not payloads.owner_matches(decoded['data'], '', KEY)
+
+
+@pytest.mark.parametrize('position', [3, 20, 40, 48])
+def test_tampered_compact_payload_is_rejected(position):
+    # Bytes in the nft_id, transaction_id, owner_ref and mac fields
+    payload = _tampered(payloads.encode_payload(NFT_ID, TRANSACTION_ID, OWNER, KEY), position)
+    with pytest.raises(payloads.InvalidPayload):
+        payloads.decode_payload(payload, KEY)
+
+
+def test_compact_payload_signed_with_another_key_is_rejected():
+    payload = payloads.encode_payload(NFT_ID, TRANSACTION_ID, OWNER, 'other-key')
+    # Existing handlers catch the JWT error for both formats
+    with pytest.raises(jwt.InvalidTokenError):
+        payloads.decode_payload(payload, KEY)
+
+
+def test_truncated_compact_payload_is_rejected():
+    raw = base64.b85decode(payloads.encode_payload(NFT_ID, TRANSACTION_ID, OWNER, KEY))
+    with pytest.raises(payloads.InvalidPayload):
+        payloads.decode_payload(base64.b85encode(raw[:-4]).decode('ascii'), KEY)
+
+
+def test_legacy_jwt_payloads_are_still_accepted():
+    # Written before the compact format existed
+    legacy = jwt.encode({"data": {"owner_mail": OWNER, "nft_id": NFT_ID, "transaction_id": TRANSACTION_ID}},
+                        KEY, algorithm="HS256")
+    assert not payloads.is_compact(legacy)
+
+    decoded = payloads.decode_payload(legacy, KEY)
+    assert decoded['data']['nft_id'] == NFT_ID
+    assert payloads.owner_matches(decoded['data'], OWNER, KEY)
+    assert not payloads.owner_matches(decoded['data'], 'someone@example.com', KEY)
+
+    with pytest.raises(jwt.InvalidTokenError):
+        payloads.decode_payload(legacy[:-2] + 'xx', KEY)
+
+
+def test_payload_format_setting(monkeypatch):
+    monkeypatch.setenv('STEGO_PAYLOAD_FORMAT', 'jwt')
+    payload = payloads.encode_payload(NFT_ID, TRANSACTION_ID, OWNER, KEY)
+    assert not payloads.is_compact(payload)
+    assert payloads.decode_payload(payload, KEY)['data']['owner_mail'] == OWNER
+
+    monkeypatch.setenv('STEGO_PAYLOAD_FORMAT', 'protobuf')
+    with pytest.raises(ValueError):
+        payloads.encode_payload(NFT_ID, TRANSACTION_ID, OWNER, KEY)
+
+
+@pytest.mark.parametrize('engine', steganography.ENGINES)
+def test_compact_payload_survives_both_engines(engine, monkeypatch):
+    monkeypatch.setenv('STEGO_ENGINE', engine)
+    payload = payloads.encode_payload(NFT_ID, TRANSACTION_ID, OWNER, KEY)
+    img = steganography.hide(Image.new('RGB', (64, 64), (120, 80, 40)), payload)
+    # stegano closes the image it reveals from, so reveal once
+    revealed = steganography.reveal(img)
+    assert revealed == payload
+    assert payloads.decode_payload(revealed, KEY)['data']['nft_id'] == NFT_ID
+
+
+def _timed(function, repeats: int) -> float:
+    function()  # Warm up
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def test_embed_and_extract_time_by_payload_size(monkeypatch):
+    pixels = np.random.default_rng(11).integers(0, 256, (1024, 1024, 3), dtype=np.uint8)
+    canvas = Image.fromarray(pixels)
+    monkeypatch.setenv('STEGO_PAYLOAD_FORMAT', 'jwt')
+    legacy = payloads.encode_payload(NFT_ID, TRANSACTION_ID, OWNER, KEY)
+    monkeypatch.setenv('STEGO_PAYLOAD_FORMAT', 'compact')
+    compact = payloads.encode_payload(NFT_ID, TRANSACTION_ID, OWNER, KEY)
+
+    print()
+    print(f"{'payload':>10} {'chars':>6} {'pixels':>7} {'embed ms':>9} {'extract ms':>11} {'stream ms':>10}")
+    for name, payload in (('compact', compact), ('jwt', legacy), ('4k', 'x' * 4096), ('64k', 'x' * 65536)):
+        stego = steganography.hide(canvas, payload)
+        buffer = io.BytesIO()
+        stego.save(buffer, 'PNG', compress_level=1)
+        encoded = buffer.getvalue()
+
+        assert steganography.reveal(stego) == payload
+        assert asyncio.run(png_stream.reveal_from_buffer(encoded)) == payload
+
+        embed = _timed(lambda: steganography.hide(canvas, payload), 5)
+        extract = _timed(lambda: steganography.reveal(stego), 5)
+        stream = _timed(lambda: asyncio.run(png_stream.reveal_from_buffer(encoded)), 5)
+        print(f"{name:>10} {len(payload):>6} {steganography.required_pixels(payload):>7} "
+              f"{embed * 1000:>9.2f} {extract * 1000:>11.2f} {stream * 1000:>10.2f}")
+
+    # Even for a short mail the compact record needs under a third of the JWT's pixels
+    assert steganography.required_pixels(compact) * 3 < steganography.required_pixels(legacy)
@@ -0,0 +1,127 @@
+"""
+Near-duplicate detection tests for the perceptual hash index.
+"""
+import io
+import random
+
+import numpy as np
+from PIL import Image
+
+from services.image_tasks import dhash
+from services.perceptual_index import MultiIndexHash, PerceptualIndex, hamming
+
+
+MAX_DISTANCE = 6
+
+
+def _artwork(seed: int) -> Image.Image:
+    # Smooth colour fields, so resized copies keep the same gradients
+    pixels = np.random.default_rng(seed).integers(0, 256, (16, 16, 3), dtype=np.uint8)
+    return Image.fromarray(pixels).resize((256, 256), Image.BICUBIC)
+
+
+def _reencoded(img: Image.Image) -> Image.Image:
+    buffer = io.BytesIO()
+    img.resize((200, 180)).save(buffer, 'JPEG', quality=70)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def _flip(value: int, positions) -> int:
+    for position in positions:
+        value ^= 1 << position
+    return value
+
+
+def _index() -> PerceptualIndex:
+    index = PerceptualIndex(collection=None)
+    index.max_distance = MAX_DISTANCE
+    return index
+
+
+def test_search_matches_brute_force():
+    rng = random.Random(3)
+    table = MultiIndexHash()
+    hashes = {f"nft_{number}": rng.getrandbits(64) for number in range(2000)}
+    for nft_id, value in hashes.items():
+        table.add(value, nft_id)
+
+    queries = list(hashes.values())[:50]
+    # Near copies with the flipped bits spread over as many chunks as possible
+    queries += [_flip(value, rng.sample(range(64), rng.randint(1, 10))) for value in queries]
+    for query in queries:
+        expected = sorted((hamming(query, value), nft_id) for nft_id, value in hashes.items()
+                          if hamming(query, value) <= MAX_DISTANCE)
+        assert table.search(query, MAX_DISTANCE) == expected
+
+
+def test_search_finds_differences_spread_over_every_chunk():
+    table = MultiIndexHash()
+    value = random.Random(5).getrandbits(64)
+    table.add(value, "original")
+    # 2 + 2 + 1 + 1 bits: only the chunks with a single flip are within the lookup radius
+    near = _flip(value, [0, 1, 16, 17, 32, 48])
+    assert table.search(near, MAX_DISTANCE) == [(6, "original")]
+    # One bit beyond the threshold is a miss even though a chunk still matches exactly
+    far = _flip(near, [2])
+    assert table.search(far, MAX_DISTANCE) == []
+
+
+def test_discard_removes_the_hash_from_every_chunk():
+    table = MultiIndexHash()
+    table.add(0x0123456789abcdef, "a")
+    table.discard(0x0123456789abcdef, "a")
+    assert table.search(0x0123456789abcdef, MAX_DISTANCE) == []
+    assert all(not chunks for chunks in table._tables)
+
+
+def test_resized_and_reencoded_copies_are_duplicates():
+    index = _index()
+    original = _artwork(1)
+    assert index.reserve("original", dhash(original)) is None
+
+    duplicate = index.find_duplicate(dhash(_reencoded(original)))
+    assert duplicate is not None
+    assert duplicate[0] == "original"
+    assert duplicate[1] <= MAX_DISTANCE
+
+
+def test_different_artworks_are_not_duplicates():
+    index = _index()
+    for seed in range(20):
+        assert index.reserve(f"nft_{seed}", dhash(_artwork(seed))) is None
+    assert index.metrics()['hashes'] == 20
+    assert index.metrics()['duplicates'] == 0
+
+
+def test_flat_images_are_never_duplicates():
+    index = _index()
+    solid_red = dhash(Image.new('RGB', (100, 100), (200, 10, 10)))
+    solid_blue = dhash(Image.new('RGB', (100, 100), (0, 0, 255)))
+    gradient = dhash(Image.linear_gradient('L').rotate(90).convert('RGB'))
+
+    # Their hashes can't tell artworks apart, so they are neither indexed nor matched
+    for nft_id, phash in (("red", solid_red), ("blue", solid_blue), ("gradient", gradient)):
+        assert index.reserve(nft_id, phash) is None
+    assert index.metrics()['hashes'] == 0
+    assert index.find_duplicate(solid_red) is None
+
+
+def test_aborted_mint_releases_its_reservation():
+    index = _index()
+    phash = dhash(_artwork(2))
+    assert index.reserve("first", phash) is None
+    # A concurrent mint of the same artwork is rejected while the first one holds the hash
+    assert index.reserve("second", phash) == ("first", 0)
+
+    # The first mint failed and was compensated, the artwork can be minted again
+    index.remove("first")
+    assert index.reserve("second", phash) is None
+    assert index.find_duplicate(phash) == ("second", 0)
+
+
+def test_published_hashes_are_not_added_twice():
+    index = _index()
+    phash = dhash(_artwork(4))
+    assert index.add("nft", phash)
+    assert not index.add("nft", phash)
+    assert index.metrics()['hashes'] == 1
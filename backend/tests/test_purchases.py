@@ -0,0 +1,121 @@
+"""
+Concurrency tests for PurchaseEngine against a real replica set.
+
+Transactions and write conflicts can't be emulated by an in-memory MongoDB, so
+these tests skip unless MONGO_TEST_URI points at a replica-set mongod.
+"""
+import asyncio
+from datetime import datetime, timezone
+
+import motor.motor_asyncio
+from bson import ObjectId
+
+from services.purchases import PurchaseEngine, PurchaseRejected
+from services.watermark_jobs import WatermarkJobQueue
+
+
+BUYERS = 300
+PRICE = 10
+
+
+async def _setup(uri: str, name: str):
+    client = motor.motor_asyncio.AsyncIOMotorClient(uri, maxPoolSize=BUYERS)
+    database = client[name]
+    # Collections must exist before they can be written inside a transaction
+    for collection in ('nfts', 'users', 'transactions', 'watermark_jobs'):
+        await database.create_collection(collection)
+    engine = PurchaseEngine(client, database['nfts'], database['users'], database['transactions'],
+                            WatermarkJobQueue(database['watermark_jobs']))
+    return client, database, engine
+
+
+async def _total_balance(database) -> int:
+    totals = await database['users'].aggregate([{"$group": {"_id": None, "total": {"$sum": "$balance"}}}]).to_list(None)
+    return totals[0]['total']
+
+
+async def _purchase(engine, nft_id: str, buyer: dict):
+    try:
+        return await engine.purchase(nft_id, str(buyer['_id']), buyer['mail'])
+    except PurchaseRejected as rejected:
+        return rejected
+
+
+def test_concurrent_buyers_have_exactly_one_winner(replica_set_database):
+    async def scenario():
+        client, database, engine = await _setup(*replica_set_database)
+        try:
+            seller = {"_id": ObjectId(), "mail": "seller@example.com", "balance": 0}
+            buyers = [{"_id": ObjectId(), "mail": f"buyer{index}@example.com", "balance": 100} for index in range(BUYERS)]
+            await database['users'].insert_many([seller, *buyers])
+            nft_id = ObjectId()
+            await database['nfts'].insert_one({
+                "_id": nft_id, "name": "Contested", "price": PRICE, "status": "active",
+                "owner_mail": seller['mail'], "publisher_mail": seller['mail'],
+                "timestamp": datetime.now(timezone.utc)
+            })
+            balance_before = await _total_balance(database)
+
+            results = await asyncio.gather(*[_purchase(engine, str(nft_id), buyer) for buyer in buyers])
+
+            winners = [result for result in results if not isinstance(result, PurchaseRejected)]
+            assert len(winners) == 1
+            assert all(result.status_code == 400 for result in results if isinstance(result, PurchaseRejected))
+
+            winner = winners[0]
+            nft = await database['nfts'].find_one({"_id": nft_id})
+            winner_mail = next(buyer['mail'] for buyer in buyers if buyer['mail'] == nft['owner_mail'])
+            assert nft['status'] == 'inactive'
+            assert winner['seller_mail'] == seller['mail']
+            assert winner['new_balance'] == 100 - PRICE
+
+            assert await _total_balance(database) == balance_before
+            assert (await database['users'].find_one({"_id": seller['_id']}))['balance'] == PRICE
+            assert (await database['users'].find_one({"mail": winner_mail}))['balance'] == 100 - PRICE
+            assert await database['users'].count_documents({"balance": 100}) == BUYERS - 1
+
+            purchases = await database['transactions'].find({"type": "purchase"}).to_list(None)
+            assert len(purchases) == 1
+            assert purchases[0]['to'] == winner_mail
+            assert str(purchases[0]['_id']) == winner['transaction_id']
+
+            # The re-watermark job was committed with the purchase, for the winner only
+            jobs = await database['watermark_jobs'].find({"nft_id": str(nft_id)}).to_list(None)
+            assert len(jobs) == 1
+            assert jobs[0]['owner_mail'] == winner_mail
+            assert jobs[0]['transaction_id'] == winner['transaction_id']
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
+
+
+def test_one_balance_cannot_pay_for_several_nfts(replica_set_database):
+    async def scenario():
+        client, database, engine = await _setup(*replica_set_database)
+        try:
+            seller = {"_id": ObjectId(), "mail": "seller@example.com", "balance": 0}
+            # Enough for three of the NFTs, racing for fifty of them
+            buyer = {"_id": ObjectId(), "mail": "buyer@example.com", "balance": 3 * PRICE}
+            await database['users'].insert_many([seller, buyer])
+            nft_ids = [ObjectId() for _ in range(50)]
+            await database['nfts'].insert_many([
+                {"_id": nft_id, "name": f"NFT {index}", "price": PRICE, "status": "active",
+                 "owner_mail": seller['mail'], "publisher_mail": seller['mail'],
+                 "timestamp": datetime.now(timezone.utc)}
+                for index, nft_id in enumerate(nft_ids)
+            ])
+
+            results = await asyncio.gather(*[_purchase(engine, str(nft_id), buyer) for nft_id in nft_ids])
+
+            winners = [result for result in results if not isinstance(result, PurchaseRejected)]
+            assert len(winners) == 3
+            assert (await database['users'].find_one({"_id": buyer['_id']}))['balance'] == 0
+            assert (await database['users'].find_one({"_id": seller['_id']}))['balance'] == 3 * PRICE
+            assert await database['nfts'].count_documents({"owner_mail": buyer['mail']}) == 3
+            assert await database['transactions'].count_documents({"type": "purchase"}) == 3
+            assert await database['watermark_jobs'].count_documents({"owner_mail": buyer['mail']}) == 3
+        finally:
+            client.close()
+
+    asyncio.run(scenario())
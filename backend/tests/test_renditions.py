@@ -0,0 +1,92 @@
+"""
+Listing rendition tests, including uploads to the local fake Cloudinary endpoint.
+"""
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from services import image_tasks
+from services.http_client import http_client
+from services.storage import StorageUploadError
+
+
+def _artwork(width: int, height: int) -> Image.Image:
+    pixels = np.random.default_rng(9).integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+    return Image.fromarray(pixels).resize((width, height), Image.BICUBIC)
+
+
+def _opened(data: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(data))
+
+
+def test_renditions_are_scaled_webp_copies():
+    renditions = image_tasks._renditions(_artwork(3000, 2000))
+    assert set(renditions) == set(image_tasks.RENDITIONS)
+    for name, (size, _) in image_tasks.RENDITIONS.items():
+        rendition = _opened(renditions[name])
+        assert rendition.format == 'WEBP'
+        # Longest side fits, aspect ratio is kept
+        assert rendition.size == (size, round(size * 2 / 3))
+
+
+def test_small_artwork_is_not_upscaled():
+    renditions = image_tasks._renditions(_artwork(320, 240))
+    assert _opened(renditions['preview']).size == (320, 240)
+    assert _opened(renditions['thumbnail']).size == (320, 240)
+
+
+def test_ingest_returns_renditions_of_the_artwork(tmp_path):
+    path = tmp_path / 'upload.png'
+    _artwork(2048, 1024).save(path)
+    hidden_data, master, phash, renditions = image_tasks.ingest_upload(str(path), 'ownership payload', 50_000_000)
+    assert hidden_data is None
+    assert _opened(master).size == (2048, 1024)
+    assert _opened(renditions['preview']).size == (1280, 640)
+    assert _opened(renditions['thumbnail']).size == (400, 200)
+    # Listing images are far smaller than the lossless master
+    assert len(renditions['thumbnail']) < len(renditions['preview']) < len(master)
+
+
+def _upload_images(main, nft_id: str):
+    async def scenario():
+        await http_client.start()
+        main.storage.start()
+        try:
+            master = image_tasks.encode_image(_artwork(640, 480), 'fast')
+            return await main.uploadNftImagesHelper(nft_id, {
+                "image": master, **image_tasks._renditions(_artwork(640, 480))
+            })
+        finally:
+            await http_client.stop()
+
+    return asyncio.run(scenario())
+
+
+def test_master_and_renditions_are_uploaded(app_module, fake_cloudinary):
+    image_urls = _upload_images(app_module, 'abc')
+    assert set(image_urls) == {'image_url', 'preview_url', 'thumbnail_url'}
+    assert image_urls['thumbnail_url'].endswith('/nft_images/nft_abc_thumbnail.png')
+    assert set(fake_cloudinary.assets) == {
+        'nft_images/nft_abc', 'nft_images/nft_abc_preview', 'nft_images/nft_abc_thumbnail'
+    }
+
+
+def test_failed_master_upload_destroys_the_renditions(app_module, fake_cloudinary):
+    fake_cloudinary.rejected = {'nft_images/nft_abc'}
+    with pytest.raises(StorageUploadError):
+        _upload_images(app_module, 'abc')
+    # The renditions were uploaded, then deleted again
+    assert len(fake_cloudinary.uploads()) == 3
+    assert sorted(fake_cloudinary.destroyed) == ['nft_images/nft_abc_preview', 'nft_images/nft_abc_thumbnail']
+    assert fake_cloudinary.assets == {}
+
+
+def test_failed_rendition_upload_keeps_the_master(app_module, fake_cloudinary):
+    fake_cloudinary.rejected = {'nft_images/nft_abc_preview'}
+    image_urls = _upload_images(app_module, 'abc')
+    # Listings fall back to image_url for the missing rendition
+    assert set(image_urls) == {'image_url', 'thumbnail_url'}
+    assert set(fake_cloudinary.assets) == {'nft_images/nft_abc', 'nft_images/nft_abc_thumbnail'}
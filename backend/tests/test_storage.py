@@ -0,0 +1,111 @@
+"""
+Cloudinary upload tests against a local fake upload endpoint (CLOUDINARY_UPLOAD_URL).
+"""
+import asyncio
+
+import pytest
+
+from services.http_client import http_client
+from services.storage import CloudinaryStorage, StorageUploadError
+
+
+def _run(scenario):
+    async def with_storage():
+        await http_client.start()
+        storage = CloudinaryStorage()
+        storage.start()
+        try:
+            return await scenario(storage)
+        finally:
+            await http_client.stop()
+
+    return asyncio.run(with_storage())
+
+
+def test_upload_retries_transient_failures(fake_cloudinary):
+    fake_cloudinary.failures = [503]
+
+    async def scenario(storage):
+        result = await storage.upload(b'png bytes', folder='nft_images', public_id='nft_1', resource_type='image')
+        return result, storage.metrics()
+
+    result, metrics = _run(scenario)
+    assert result['public_id'] == 'nft_images/nft_1'
+    assert result['secure_url'].endswith('/nft_images/nft_1.png')
+    assert fake_cloudinary.assets == {'nft_images/nft_1': b'png bytes'}
+    assert len(fake_cloudinary.uploads()) == 2
+    assert metrics['uploads'] == 1
+    assert metrics['retries'] == 1
+    assert metrics['failures'] == 0
+    assert metrics['bytes_uploaded'] == len(b'png bytes')
+    assert metrics['in_flight'] == 0
+
+
+def test_upload_gives_up_after_max_retries(fake_cloudinary, monkeypatch):
+    monkeypatch.setenv('STORAGE_UPLOAD_RETRIES', '2')
+    fake_cloudinary.failures = [503] * 5
+
+    async def scenario(storage):
+        with pytest.raises(StorageUploadError, match="after 3 attempts"):
+            await storage.upload(b'png bytes', folder='nft_images', public_id='nft_1')
+        return storage.metrics()
+
+    metrics = _run(scenario)
+    assert len(fake_cloudinary.uploads()) == 3
+    assert metrics['retries'] == 2
+    assert metrics['failures'] == 1
+    assert metrics['uploads'] == 0
+    assert fake_cloudinary.assets == {}
+
+
+def test_rejected_upload_is_not_retried(fake_cloudinary):
+    fake_cloudinary.failures = [400]
+
+    async def scenario(storage):
+        with pytest.raises(StorageUploadError, match="status 400"):
+            await storage.upload(b'png bytes', folder='nft_images', public_id='nft_1')
+        return storage.metrics()
+
+    metrics = _run(scenario)
+    assert len(fake_cloudinary.uploads()) == 1
+    assert metrics['retries'] == 0
+    assert metrics['failures'] == 1
+
+
+def test_destroy_removes_the_asset(fake_cloudinary):
+    async def scenario(storage):
+        await storage.upload(b'png bytes', folder='nft_images', public_id='nft_1')
+        assert await storage.destroy('nft_images/nft_1')
+        return storage.metrics()
+
+    metrics = _run(scenario)
+    assert fake_cloudinary.assets == {}
+    assert metrics['deletes'] == 1
+
+
+def test_destroy_reports_failures(fake_cloudinary, monkeypatch):
+    # Nothing serves destroy next to this upload endpoint
+    monkeypatch.setenv('CLOUDINARY_UPLOAD_URL', fake_cloudinary.server.url('/elsewhere/upload'))
+
+    async def scenario(storage):
+        assert not await storage.destroy('nft_images/nft_1')
+        return storage.metrics()
+
+    assert _run(scenario)['deletes'] == 0
+
+
+def test_concurrent_uploads_are_capped(fake_cloudinary, monkeypatch):
+    monkeypatch.setenv('STORAGE_MAX_CONCURRENT_UPLOADS', '2')
+    fake_cloudinary.delay = 0.1
+
+    async def scenario(storage):
+        await asyncio.gather(*[
+            storage.upload(b'png bytes', folder='nft_images', public_id=f'nft_{index}') for index in range(6)
+        ])
+        return storage.metrics()
+
+    metrics = _run(scenario)
+    assert len(fake_cloudinary.assets) == 6
+    assert fake_cloudinary.max_active == 2
+    assert metrics['uploads'] == 6
+    assert metrics['max_concurrent_uploads'] == 2
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from services.user_cache import UserCache
+
+
+def test_concurrent_misses_share_one_load():
+    async def scenario():
+        cache = UserCache()
+        loads = []
+
+        async def loader():
+            loads.append(1)
+            await asyncio.sleep(0.01)
+            return {"_id": "u1", "mail": "a@b.c"}
+
+        users = await asyncio.gather(*[cache.get("u1", loader) for _ in range(5)])
+        return users, loads
+
+    users, loads = asyncio.run(scenario())
+    assert len(loads) == 1
+    assert all(user == {"_id": "u1", "mail": "a@b.c"} for user in users)
+
+
+def test_waiters_survive_a_cancelled_load():
+    async def scenario():
+        cache = UserCache()
+        release = asyncio.Event()
+
+        async def slow_loader():
+            await release.wait()
+            return {"_id": "u1", "mail": "first"}
+
+        async def loader():
+            return {"_id": "u1", "mail": "second"}
+
+        first = asyncio.create_task(cache.get("u1", slow_loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get("u1", loader))
+        await asyncio.sleep(0)
+
+        # The request doing the load goes away, the waiter must load the user itself
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await asyncio.wait_for(waiter, timeout=1)
+
+    assert asyncio.run(scenario()) == {"_id": "u1", "mail": "second"}
+
+
+def test_loader_errors_reach_waiters():
+    async def scenario():
+        cache = UserCache()
+
+        async def loader():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("database unavailable")
+
+        return await asyncio.gather(*[cache.get("u1", loader) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -207,8 +207,9 @@ const Artworks = () => {
                   <>
                     <div className="relative aspect-square overflow-hidden">
                       <img 
-                        src={nft.image_url || nft.image} 
+                        src={nft.thumbnail_url || nft.image_url || nft.image} 
                         alt={nft.name} 
+                        loading="lazy"
                         className="w-full h-full object-cover"
                         onError={(e) => {
                           e.target.onerror = null;
@@ -241,8 +242,9 @@ const Artworks = () => {
                   <>
                     <div className="w-20 h-20 rounded-lg overflow-hidden flex-shrink-0">
                       <img 
-                        src={nft.image_url || nft.image} 
+                        src={nft.thumbnail_url || nft.image_url || nft.image} 
                         alt={nft.name} 
+                        loading="lazy"
                         className="w-full h-full object-cover"
                         onError={(e) => {
                           e.target.onerror = null;
@@ -144,8 +144,9 @@ const Marketplace = () => {
                 <div key={nft._id} className="group cursor-pointer" onClick={() => navigate(`/nft/${nft._id}`)}>
                   <div className="relative overflow-hidden rounded-lg mb-2">
                     <img 
-                      src={nft.image_url} 
+                      src={nft.thumbnail_url || nft.image_url} 
                       alt={nft.name} 
+                      loading="lazy"
                       className="w-full h-48 object-cover transition-transform duration-300 group-hover:scale-110"
                       draggable="false"
                       onError={(e) => {
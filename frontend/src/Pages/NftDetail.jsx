@@ -290,7 +290,7 @@ const NftDetail = () => {
           <div className="bg-white/10 backdrop-blur-lg rounded-xl p-6 shadow-lg border border-white/5">
             <div className="relative aspect-square overflow-hidden rounded-lg mb-4">
               <img 
-                src={currentNft?.image_url} 
+                src={currentNft?.preview_url || currentNft?.image_url} 
                 alt={currentNft?.name} 
                 className="w-full h-full object-cover"
                 draggable="false"
@@ -6,8 +6,9 @@ const ArtworkCard = ({ nft, user, formatCurrency }) => {
     <div className="group cursor-pointer">
       <div className="relative overflow-hidden rounded-lg mb-2">
         <img 
-          src={nft.image_url} 
+          src={nft.thumbnail_url || nft.image_url} 
           alt={nft.name} 
+          loading="lazy"
           className="w-full h-40 object-cover transition-transform duration-300 group-hover:scale-110"
           onError={(e) => {
             e.target.onerror = null;
@@ -418,6 +418,18 @@ export const AppProvider = ({ children }) => {
   
   // Handle user logout
   const handleLogout = () => {
+    const auth_token = localStorage.getItem('auth_token');
+
+    // Revoke the token on the backend, the local logout doesn't wait for it
+    if (auth_token) {
+      axios.post(`${backendURI}/logout`, {}, {
+        headers: {
+          'Content-Type': 'application/json',
+          'auth_token': auth_token
+        }
+      }).catch(() => {});
+    }
+
     localStorage.removeItem('auth_token');
     setUser(null);
     setIsAuthenticated(false);
@@ -458,7 +470,9 @@ export const AppProvider = ({ children }) => {
         success: response.data.success,
         message: response.data.message,
         nft_id: response.data.nft_id,
-        image_url: response.data.image_url
+        image_url: response.data.image_url,
+        thumbnail_url: response.data.thumbnail_url,
+        preview_url: response.data.preview_url
       };
     } catch (err) {
       console.error('NFT upload error:', err);